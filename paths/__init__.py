@@ -1,7 +1,16 @@
-from .rbm import RBM
+from .rbm import RBM, MarginalRBM, RBMKernel
 from .core import take_time
-from .ising import IsingModel, IsingKernel
-from .potts import PottsModel, PottsKernel
-from .entropy import Entropy, IsingEntropy, PottsEntropy
-from .simulate import make_bridge, simulate
-from .gaussian import Gaussian, GaussianKernel, Bridge, GeometricBridge, Scheduler
+from .ising import IsingModel, PackedIsingModel, IsingKernel, SwendsenWangKernel, \
+     WolffKernel, lattice_bridge
+from .potts import PottsModel, PottsKernel, PottsSwendsenWangKernel, PottsWolffKernel
+from .entropy import Entropy, IsingEntropy, PottsEntropy, ThermodynamicScheduler
+from .simulate import make_bridge, simulate, simulate_sharded, simulate_bidirectional, \
+     simulate_iter, simulate_until, resume, adaptive_schedule, BackgroundSimulation, \
+     Executor, ThreadExecutor
+from .storage import Checkpoint, TrajectoryStore
+from .smc import smc
+from .resampling import ess, conditional_ess, systematic_resampling, residual_resampling
+from .gaussian import Gaussian, GaussianKernel, Bridge, GeometricBridge, CompiledBridge, \
+     Scheduler, work_statistics
+from .multivariate import MultivariateGaussian, MultivariateGaussianKernel, MultivariateBridge, \
+     MultivariateGeometricBridge
@@ -8,12 +8,146 @@
  extern "C" {
 #endif
 
+#if defined(__GNUC__) && defined(__POPCNT__)
+#define popcount64(x) __builtin_popcountll(x)
+#else
+/* without a popcnt instruction the builtin becomes a library call */
+static int popcount64(npy_uint64 x) {
+  x = x - ((x >> 1) & 0x5555555555555555ULL);
+  x = (x & 0x3333333333333333ULL) + ((x >> 2) & 0x3333333333333333ULL);
+  x = (x + (x >> 4)) & 0x0F0F0F0F0F0F0F0FULL;
+  return (int) ((x * 0x0101010101010101ULL) >> 56);
+}
+#endif
+
+#define EVEN_BITS 0x5555555555555555ULL
+
+/*
+  Lattices are stored with one byte per site: Ising spins +1/-1 as
+  int8 and Potts colors 0..Q-1 (Q <= 256) as uint8. RBM states are
+  stored as uint8.
+ */
+
+typedef npy_int8  spin_t;
+typedef npy_uint8 color_t;
+
+static int check_states(PyArrayObject *arr) {
+  /* lattices must be contiguous byte arrays */
+  if (PyArray_ITEMSIZE(arr) != 1 || !PyArray_ISCARRAY(arr)) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array required");
+    return 0;
+  }
+  return 1;
+}
+
+static int check_packed(PyArrayObject *arr, int L) {
+  /* packed lattices are contiguous uint64 arrays of L*W words per path */
+  if (PyArray_TYPE(arr) != NPY_UINT64 || !PyArray_ISCARRAY(arr)) {
+    PyErr_SetString(PyExc_TypeError, "contiguous uint64 array required");
+    return 0;
+  }
+  if (L <= 0 || PyArray_SIZE(arr) % (L*((L+63)/64))) {
+    PyErr_SetString(PyExc_ValueError, "packed array must hold L*W words per path");
+    return 0;
+  }
+  return 1;
+}
+
+/*
+  Random numbers: every chain owns a splitmix64 generator whose state
+  is seeded from Python, so the kernels neither touch global state nor
+  depend on the order in which chains or rows are processed.
+ */
+
+static npy_uint64 rng_mix(npy_uint64 z) {
+  z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+  z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+  return z ^ (z >> 31);
+}
+
+static npy_uint64 rng_next(npy_uint64 *state) {
+  return rng_mix(*state += 0x9E3779B97F4A7C15ULL);
+}
+
+static double rng_uniform(npy_uint64 *state) {
+  /* uniform random number in [0,1) with 53 random bits */
+  return (rng_next(state) >> 11) * (1. / 9007199254740992.);
+}
+
+static int rng_int(npy_uint64 *state, int n) {
+  /* uniform random integer in 0,...,n-1 */
+  return (int) (rng_uniform(state) * n);
+}
+
+static npy_uint64 rng_stream(npy_uint64 seed, npy_uint64 counter) {
+  /* seed of an independent substream labeled by counter */
+  return rng_mix(seed ^ rng_mix(counter + 0x9E3779B97F4A7C15ULL));
+}
+
+static npy_uint64 *rng_seeds(PyArrayObject *arr, npy_intp n) {
+  /* seeds of n chains, sets an exception if they do not match */
+  if (PyArray_TYPE(arr) != NPY_UINT64 || PyArray_SIZE(arr) != n) {
+    PyErr_SetString(PyExc_ValueError, "one uint64 seed per chain required");
+    return NULL;
+  }
+  return (npy_uint64*) arr->data;
+}
+
+static int get_energies(PyObject *obj, npy_intp n, double **E) {
+  /*
+    Optional energies of n chains which are updated by the samplers,
+    returns 0 and sets an exception if obj is neither None nor a
+    contiguous double array of size n.
+   */
+  *E = NULL;
+  if (obj == NULL || obj == Py_None) return 1;
+
+  if (!PyArray_Check(obj) || !PyArray_ISCARRAY((PyArrayObject*) obj) ||
+      PyArray_TYPE((PyArrayObject*) obj) != NPY_DOUBLE ||
+      PyArray_SIZE((PyArrayObject*) obj) != n) {
+    PyErr_SetString(PyExc_ValueError, "one double energy per chain required");
+    return 0;
+  }
+  *E = (double*) PyArray_DATA((PyArrayObject*) obj);
+
+  return 1;
+}
+
+static void rng_words(npy_uint64 seed, npy_uint64 counter, npy_uint32 *u, int m) {
+  /*
+    2*m random 32 bit words of a substream: the lower halves of m
+    splitmix64 outputs go to u[0..m-1], the upper halves to u[m..2m-1].
+    splitmix64 is counter based, so there is no loop-carried dependence
+    (the loop only vectorizes where 64 bit vector multiplies exist).
+   */
+  npy_uint64 state = rng_stream(seed, counter), z;
+  npy_uint32 *__restrict lo = u, *__restrict hi = u + m;
+  int k;
+  for (k = 0; k < m; k++) {
+    z = rng_mix(state + (k+1) * 0x9E3779B97F4A7C15ULL);
+    lo[k] = (npy_uint32) z;
+    hi[k] = (npy_uint32) (z >> 32);
+  }
+}
+
+static void accept_thresholds(double beta, int n, int step, npy_int32 *w) {
+  /*
+    Metropolis acceptance probabilities min(1, exp(-beta*dE)) for the
+    energy changes dE = step*(k-n/2), k=0..n-1, as 30 bit thresholds:
+    a move is accepted if (u >> 2) < w[k] for a random 32 bit word u.
+   */
+  int k;
+  for (k = 0; k < n; k++) {
+    w[k] = (npy_int32) (fmin(1., exp(-beta * step * (k - n/2))) * (1 << 30));
+  }
+}
+
 static int delta(int x, int y) {
   // Kronecker delta
   return (int) (x==y);
 }
 
-static int dE_ising(int L, int *x, int i, int j){
+static int dE_ising(int L, spin_t *x, int i, int j){
   /*
     Energy change if a spin (i,j) flips.
    */
@@ -24,7 +158,7 @@ static int dE_ising(int L, int *x, int i, int j){
   return 2 * x[L*i+j] * s;
 }
 
-static int dE_potts(int L, int *x, int i, int j, int q){
+static int dE_potts(int L, color_t *x, int i, int j, int q){
 
   int q_old, q_neigh, E=0;
 
@@ -45,52 +179,281 @@ static int dE_potts(int L, int *x, int i, int j, int q){
   return -E;
 }
 
+/*
+  Bit-packed Ising lattices: row i of a lattice occupies W = ceil(L/64)
+  consecutive 64 bit words, bit j%64 of word j/64 is set if spin (i,j)
+  points up. Padding bits beyond column L-1 are always zero.
+ */
+
+static npy_uint64 packed_mask(int L) {
+  /* valid bits in the last word of a row */
+  return (L % 64) ? (1ULL << (L % 64)) - 1 : ~0ULL;
+}
+
+static void packed_rotate(int L, int W, npy_uint64 *r, npy_uint64 *left, npy_uint64 *right) {
+  /*
+    Spins of the left and right neighbors of all sites in row r,
+    i.e. bit j of left/right holds spin (j-1)%L / (j+1)%L.
+   */
+  int w;
+
+  for (w = 0; w < W; w++) {
+    left[w]  = (r[w] << 1) | (w > 0 ? r[w-1] >> 63 : 0);
+    right[w] = (r[w] >> 1) | (w < W-1 ? r[w+1] << 63 : 0);
+  }
+  left[0]  |= (r[(L-1)/64] >> ((L-1)%64)) & 1ULL;
+  left[W-1] &= packed_mask(L);
+  right[(L-1)/64] |= (r[0] & 1ULL) << ((L-1)%64);
+}
+
+static int packed_ising_energy(int L, npy_uint64 *x, npy_uint64 *buf) {
+  /*
+    Energy from the number of antiparallel bonds, buf is a work
+    buffer of 2*W words.
+   */
+  int i, w, W = (L+63)/64, n=0;
+  npy_uint64 *r, *dn, *left = buf, *right = buf + W;
+
+  for (i = 0; i < L; i++) {
+    r  = x + i*W;
+    dn = x + ((i+1)%L)*W;
+    packed_rotate(L, W, r, left, right);
+    for (w = 0; w < W; w++) {
+      n += popcount64(r[w] ^ right[w]) + popcount64(r[w] ^ dn[w]);
+    }
+  }
+
+  return 2 * n - 2 * L * L;
+}
+
+static npy_uint64 packed_threshold(double p) {
+  /* acceptance probability p in [0,1] as a 63 bit fixed point number */
+  return p < 1. ? (npy_uint64) ldexp(p, 63) : 1ULL << 63;
+}
+
+static npy_uint64 packed_accept(npy_uint64 *state, npy_uint64 m4, npy_uint64 t4,
+				npy_uint64 m8, npy_uint64 t8) {
+  /*
+    Bitwise Metropolis decisions: every bit of m4 (m8) is accepted with
+    probability t4 (t8) / 2^63. The uniform numbers of all 64 bits are
+    bit-sliced, i.e. the k-th random word holds the k-th most
+    significant bit of every number. Comparing with the threshold bit
+    by bit, a bit is decided as soon as its random bit differs from
+    the threshold bit, so only a few words are needed per mask. m4 and
+    m8 must not overlap.
+   */
+  int k;
+  npy_uint64 u, acc = 0;
+
+  if (t4 >> 63) { acc |= m4; m4 = 0; }
+  if (t8 >> 63) { acc |= m8; m8 = 0; }
+
+  for (k = 62; k >= 0 && (m4 | m8); k--) {
+    u = rng_next(state);
+    if ((t4 >> k) & 1) { acc |= m4 & ~u; m4 &= u; } else { m4 &= ~u; }
+    if ((t8 >> k) & 1) { acc |= m8 & ~u; m8 &= u; } else { m8 &= ~u; }
+  }
+
+  return acc;
+}
+
+static int packed_ising_checkerboard(double beta, int N, int L, npy_uint64 *x, npy_uint64 *buf,
+				     npy_uint64 seed, int *dE) {
+  /*
+    N multi-spin coded checkerboard sweeps: the number of antiparallel
+    neighbors of 64 spins is computed with bitwise adders, moves that
+    lower the energy are accepted for all spins at once and moves with
+    energy change 4 or 8 are decided 64 at a time (see packed_accept).
+    The total energy change is stored in dE.
+   */
+  int i, w, n, c, W = (L+63)/64, acc=0;
+  npy_uint64 *r, *up, *dn, *left = buf, *right = buf + W;
+  npy_uint64 a1, a2, a3, a4, s1, s2, c1, c2, c3, b0, zero, one, flip, active;
+  npy_uint64 t4 = packed_threshold(exp(-4*beta)), t8 = packed_threshold(exp(-8*beta));
+  npy_uint64 state = seed;
+
+  *dE = 0;
+
+  for (n = 0; n < N; n++) {
+    for (c = 0; c < 2; c++) {
+      for (i = 0; i < L; i++) {
+
+	r  = x + i*W;
+	up = x + ((i-1+L)%L)*W;
+	dn = x + ((i+1)%L)*W;
+
+	packed_rotate(L, W, r, left, right);
+
+	for (w = 0; w < W; w++) {
+
+	  active = ((i+c) % 2) ? ~EVEN_BITS : EVEN_BITS;
+	  if (w == W-1) active &= packed_mask(L);
+
+	  /* antiparallel neighbors and their bitwise sum */
+	  a1 = r[w] ^ up[w];
+	  a2 = r[w] ^ dn[w];
+	  a3 = r[w] ^ left[w];
+	  a4 = r[w] ^ right[w];
+
+	  s1 = a1 ^ a2; c1 = a1 & a2;
+	  s2 = a3 ^ a4; c2 = a3 & a4;
+	  b0 = s1 ^ s2; c3 = s1 & s2;
+
+	  zero = ~(a1 | a2 | a3 | a4);
+	  one  = b0 & ~(c1 | c2 | c3);
+
+	  flip = active & ~(zero | one);
+	  flip|= packed_accept(&state, active & one, t4, active & zero, t8);
+
+	  /* a flipped spin with k antiparallel neighbors changes E by 8-4k */
+	  *dE += 8 * popcount64(flip) - 4 * (popcount64(a1 & flip) + popcount64(a2 & flip) +
+					     popcount64(a3 & flip) + popcount64(a4 & flip));
+
+	  r[w] ^= flip;
+	  acc += popcount64(flip);
+	}
+      }
+    }
+  }
+
+  return acc;
+}
+
+static int ising_lattice_energy(int L, spin_t *x) {
+  /*
+    Energy of a single lattice. The periodic boundary is handled by
+    pointing to the next row (first row for the last one) and by
+    treating the last column separately, which avoids modulo
+    arithmetic in the inner loop.
+   */
+  int i, j, E=0;
+  spin_t *r, *d;
+
+  for (i = 0; i < L; i++) {
+    r = x + i*L;
+    d = x + (i < L-1 ? i+1 : 0)*L;
+    for (j = 0; j < L-1; j++) { 
+      E += r[j] * (r[j+1] + d[j]);
+    }
+    E += r[L-1] * (r[0] + d[L-1]);
+  }
+
+  return -E;
+}
+
+static int potts_lattice_energy(int L, color_t *x) {
+
+  int i, j, E=0;
+  color_t *r, *d;
+
+  for (i = 0; i < L; i++) {
+    r = x + i*L;
+    d = x + (i < L-1 ? i+1 : 0)*L;
+    for (j = 0; j < L-1; j++) { 
+      E += (r[j] == r[j+1]) + (r[j] == d[j]);
+    }
+    E += (r[L-1] == r[0]) + (r[L-1] == d[L-1]);
+  }
+
+  return -E;
+}
+
+static PyObject *lattice_energies(PyObject *args, int potts) {
+  /*
+    Energies of a batch of lattices of shape (n_paths, L*L)
+   */
+  PyArrayObject *arr, *E_arr;
+  int L, *E;
+  char *x;
+  npy_intp k, n_paths;
+
+  if (!(PyArg_ParseTuple(args, "iO!", &L, &PyArray_Type, &arr))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  if (PyArray_SIZE(arr) % (L*L)) {
+    PyErr_SetString(PyExc_ValueError, "array of shape (n_paths, L*L) required");
+    return NULL;
+  }
+
+  n_paths = PyArray_SIZE(arr) / (L*L);
+
+  E_arr = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (E_arr == NULL) return NULL;
+
+  x = arr->data;
+  E = (int*) E_arr->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    E[k] = potts ? potts_lattice_energy(L, (color_t*) (x + k*L*L))
+                 : ising_lattice_energy(L, (spin_t*) (x + k*L*L));
+  }
+  Py_END_ALLOW_THREADS
+
+  return PyArray_Return(E_arr);
+}
+
+static PyObject *ising_energy_batch(PyObject *self, PyObject *args) { 
+  return lattice_energies(args, 0);
+}
+
+static PyObject *potts_energy_batch(PyObject *self, PyObject *args) { 
+  return lattice_energies(args, 1);
+}
+
 static PyObject *ising_energy(PyObject *self, PyObject *args) { 
 
   PyArrayObject *arr;
-  int i, j, E=0, L, *x;
+  int E, L;
+  spin_t *x;
 
   if (!(PyArg_ParseTuple(args, "iO!", &L, &PyArray_Type, &arr))) {
-    PyErr_SetString(PyExc_TypeError, "contiguous int array required");
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array required");
     return NULL;
   }
 
-  x = (int*) arr->data;
+  if (!check_states(arr)) return NULL;
+
+  x = (spin_t*) arr->data;
   
-  for (i = 0; i < L; i++) {
-    for (j = 0; j < L; j++) { 
-      E += x[i*L+j] * (x[i*L + (j+1)%L] + x[((i+1)%L)*L + j]);
-    }
-  }
+  Py_BEGIN_ALLOW_THREADS
+  E = ising_lattice_energy(L, x);
+  Py_END_ALLOW_THREADS
 
-  return Py_BuildValue("i", -E);
+  return Py_BuildValue("i", E);
 }
 
 static PyObject *potts_energy(PyObject *self, PyObject *args) { 
 
   PyArrayObject *arr;
-  int i, j, E=0, L, *x;
+  int E, L;
+  color_t *x;
 
   if (!(PyArg_ParseTuple(args, "iO!", &L, &PyArray_Type, &arr))) {
-    PyErr_SetString(PyExc_TypeError, "contiguous int array required");
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array required");
     return NULL;
   }
 
-  x = (int*) arr->data;
+  if (!check_states(arr)) return NULL;
+
+  x = (color_t*) arr->data;
   
-  for (i = 0; i < L; i++) {
-    for (j = 0; j < L; j++) { 
-      E += delta(x[i*L+j], x[i*L + (j+1)%L]) + delta(x[i*L+j], x[((i+1)%L)*L + j]);
-    }
-  }
+  Py_BEGIN_ALLOW_THREADS
+  E = potts_lattice_energy(L, x);
+  Py_END_ALLOW_THREADS
 
-  return Py_BuildValue("i", -E);
+  return Py_BuildValue("i", E);
 }
 
 static PyObject *rbm_energy(PyObject *self, PyObject *args) { 
 
   PyArrayObject *x_arr, *a_arr, *b_arr, *W_arr;
-  int i, j, m, n, *x;
+  int i, j, m, n;
+  npy_uint8 *x;
   double *a, *b, *W, E=0.;
 
   if (!(PyArg_ParseTuple(args, "O!O!O!O!",
@@ -98,19 +461,34 @@ static PyObject *rbm_energy(PyObject *self, PyObject *args) {
 			 &PyArray_Type, &a_arr,
 			 &PyArray_Type, &b_arr,
 			 &PyArray_Type, &W_arr))) {
-    PyErr_SetString(PyExc_TypeError, "contiguous int array required");
+    PyErr_SetString(PyExc_TypeError, "contiguous uint8 and double arrays required");
     return NULL;
   }
 
-  m = a_arr->dimensions[0];
-  n = b_arr->dimensions[0];
+  if (!check_states(x_arr)) return NULL;
+
+  if (PyArray_TYPE(a_arr) != NPY_DOUBLE || !PyArray_ISCARRAY(a_arr) ||
+      PyArray_TYPE(b_arr) != NPY_DOUBLE || !PyArray_ISCARRAY(b_arr) ||
+      PyArray_TYPE(W_arr) != NPY_DOUBLE || !PyArray_ISCARRAY(W_arr)) {
+    PyErr_SetString(PyExc_TypeError, "contiguous double arrays required for parameters");
+    return NULL;
+  }
 
-  x = (int*) (x_arr->data);
+  m = PyArray_SIZE(a_arr);
+  n = PyArray_SIZE(b_arr);
+
+  if (PyArray_SIZE(x_arr) != m + n || PyArray_SIZE(W_arr) != (npy_intp) m * n) {
+    PyErr_SetString(PyExc_ValueError, "sizes of state and parameters do not match");
+    return NULL;
+  }
+
+  x = (npy_uint8*) (x_arr->data);
 
   a = (double*) (a_arr->data);
   b = (double*) (b_arr->data);
   W = (double*) (W_arr->data);
   
+  Py_BEGIN_ALLOW_THREADS
   for (i=0; i < m; i++) {
     if (x[i]) {
       E += a[i];
@@ -127,85 +505,962 @@ static PyObject *rbm_energy(PyObject *self, PyObject *args) {
       E += b[j];
     }
   }
+  Py_END_ALLOW_THREADS
 
   return Py_BuildValue("d", -E);
 }
 
-static PyObject *ising_sample(PyObject *self, PyObject *args) { 
-
-  PyArrayObject *arr;
-  int i, j, n, a, acc=0, L, N, *x;
-  double beta, E;
+static int ising_metropolis(double beta, int N, int L, spin_t *x, npy_uint64 seed, int *dE) {
+  /*
+    N single spin flip Metropolis updates of lattice x, returns the
+    number of accepted flips and stores the energy change in dE.
+   */
+  int i, j, n, a, e, acc=0;
+  double E;
+  npy_uint64 state = seed;
 
-  if (!(PyArg_ParseTuple(args, "diiO!", &beta, &N, &L, &PyArray_Type, &arr))) {
-    PyErr_SetString(PyExc_TypeError, "contiguous int array required");
-    return NULL;
-  }
+  *dE = 0;
 
-  x = (int*) arr->data;
-  
   for (n = 0; n < N; n++) {
     
-    i = rand() % L;
-    j = rand() % L;
+    i = rng_int(&state, L);
+    j = rng_int(&state, L);
 
-    E = beta * dE_ising(L, x, i, j);
+    e = dE_ising(L, x, i, j);
+    E = beta * e;
     a = 1;
 
     if (E > 0.) {
-      a = (int) (drand48() < exp(-E));
+      a = (int) (rng_uniform(&state) < exp(-E));
     }
     
     if (a) {
       x[i*L + j] *= -1;
+      *dE += e;
     }
     acc += a;
   }
-  
-  return Py_BuildValue("i", acc);
-}
 
-static PyObject *potts_sample(PyObject *self, PyObject *args) { 
+  return acc;
+}
 
-  PyArrayObject *arr;
-  int i, j, q, n, a, acc=0, L, Q, N, *x;
-  double beta, E;
+static int potts_metropolis(double beta, int N, int L, int Q, color_t *x, npy_uint64 seed, int *dE) {
+  /*
+    N single site Metropolis updates of Potts lattice x, returns the
+    number of accepted moves and stores the energy change in dE.
+   */
+  int i, j, q, n, a, e, acc=0;
+  double E;
+  npy_uint64 state = seed;
 
-  if (!(PyArg_ParseTuple(args, "diiiO!", &beta, &N, &L, &Q, &PyArray_Type, &arr))) {
-    PyErr_SetString(PyExc_TypeError, "contiguous int array required");
-    return NULL;
-  }
+  *dE = 0;
 
-  x = (int*) arr->data;
-  
   for (n = 0; n < N; n++) {
     
-    i = rand() % L;
-    j = rand() % L;
-    q = rand() % Q;
+    i = rng_int(&state, L);
+    j = rng_int(&state, L);
+    q = rng_int(&state, Q);
 
-    E = beta * dE_potts(L, x, i, j, q);
+    e = dE_potts(L, x, i, j, q);
+    E = beta * e;
     a = 1;
 
     if (E > 0.) {
-      a = (int) (drand48() < exp(-E));
+      a = (int) (rng_uniform(&state) < exp(-E));
     }
     
     if (a) {
       x[i*L + j] = q;
+      *dE += e;
     }
     acc += a;
   }
+
+  return acc;
+}
+
+/*
+  Checkerboard sweeps: within a row, the sites of one sublattice only
+  neighbor sites of the other sublattice, so they are updated
+  independently. The row kernels are branch-free loops over 32 bit
+  lanes: the acceptance threshold is selected with comparisons rather
+  than a table lookup, and the new states are first written to the
+  (already consumed) random words and then copied into the row, since
+  the strided store would prevent vectorization. Only the sites whose
+  horizontal neighbors wrap around are treated separately.
+ */
+
+static inline npy_int32 ising_threshold(int k, npy_int32 w0, npy_int32 w1,
+					npy_int32 w2, npy_int32 w3, npy_int32 w4) {
+  /* w[k] for k = (s*h+4)/2 in 0..4 as a sum of masked terms (a table
+     lookup or a chain of ternaries keeps the loop from vectorizing) */
+  return (w0 & -(k == 0)) | (w1 & -(k == 1)) | (w2 & -(k == 2))
+       | (w3 & -(k == 3)) | (w4 & -(k == 4));
+}
+
+static inline npy_int32 potts_threshold(int k, const npy_int32 *w) {
+  /* w[k] for k = E+4 in 0..8, see ising_threshold */
+  return (w[0] & -(k == 0)) | (w[1] & -(k == 1)) | (w[2] & -(k == 2))
+       | (w[3] & -(k == 3)) | (w[4] & -(k == 4)) | (w[5] & -(k == 5))
+       | (w[6] & -(k == 6)) | (w[7] & -(k == 7)) | (w[8] & -(k == 8));
+}
+
+static int ising_checkerboard_row(int L, spin_t *x, int i, int c, npy_uint32 *__restrict u,
+				  const npy_int32 *w, int *dE) {
+  /*
+    Metropolis update of all sites (i,j) in row i that belong to
+    sublattice c, i.e. (i+j)%2 == c, using one random word per site
+    from u. The energy change is added to dE.
+   */
+  npy_intp t, j;
+  int s, h, a, acc=0, e=0, M=L/2, j0=(i+c)%2;
+  int tb = j0 ? M-1 : 0, jb = j0 ? L-1 : 0;
+  npy_int32 w0=w[0], w1=w[1], w2=w[2], w3=w[3], w4=w[4];
+  spin_t *__restrict row = x + i*L;
+  const spin_t *__restrict up = x + ((i-1+L)%L)*L;
+  const spin_t *__restrict dn = x + ((i+1)%L)*L;
+
+  /* interior sites */
+  for (t = 1-j0; t < M-j0; t++) {
+    j = j0 + 2*t;
+    s = row[j];
+    h = up[j] + dn[j] + row[j-1] + row[j+1];
+    a = (npy_int32) (u[t] >> 2) < ising_threshold((s*h+4) >> 1, w0, w1, w2, w3, w4);
+    u[t] = (npy_uint32) (s - 2*a*s);
+    e += 2*a*s*h;
+    acc += a;
+  }
+
+  /* site whose horizontal neighbor wraps around */
+  s = row[jb];
+  h = up[jb] + dn[jb] + row[(jb+1)%L] + row[(jb-1+L)%L];
+  a = (npy_int32) (u[tb] >> 2) < ising_threshold((s*h+4) >> 1, w0, w1, w2, w3, w4);
+  u[tb] = (npy_uint32) (s - 2*a*s);
+  e += 2*a*s*h;
+  acc += a;
+
+  for (t = 0; t < M; t++) {
+    row[j0 + 2*t] = (spin_t) (npy_int32) u[t];
+  }
+
+  *dE += e;
+
+  return acc;
+}
+
+static int ising_checkerboard(double beta, int N, int L, spin_t *x, npy_uint32 *u, npy_uint64 seed, int *dE) {
+  /*
+    N checkerboard sweeps over lattice x (L must be even). Each sweep
+    updates both sublattices in turn; u is a work buffer of L*(L/2+1)
+    random words. Every row draws from its own substream.
+   */
+  int i, c, n, m=(L/2+1)/2, acc=0, e=0;
+  npy_int32 w[5];
+
+  /* thresholds for s*h = 2*k-4, i.e. dE = 2*s*h = 4*(k-2) */
+  accept_thresholds(beta, 5, 4, w);
   
+  for (n = 0; n < N; n++) {
+    for (c = 0; c < 2; c++) {
+
+#ifdef _OPENMP
+#pragma omp parallel for reduction(+:acc,e)
+#endif
+      for (i = 0; i < L; i++) {
+	int e_row = 0;
+	rng_words(seed, (2*n+c)*L + i, u + i*2*m, m);
+	acc += ising_checkerboard_row(L, x, i, c, u + i*2*m, w, &e_row);
+	e += e_row;
+      }
+    }
+  }
+
+  *dE = e;
+
+  return acc;
+}
+
+static int potts_checkerboard_row(int L, int Q, color_t *x, int i, int c, npy_uint32 *__restrict u,
+				  const npy_int32 *w, int *dE) {
+  /*
+    Metropolis update of all Potts sites in row i that belong to
+    sublattice c. Site t of the sublattice uses the random words u[t]
+    (acceptance) and u[L/2+t] (proposal from the upper 16 bits by
+    multiply-shift, which stays within 32 bit lanes).
+   */
+  npy_intp t, j;
+  int s, q, E, a, acc=0, e=0, M=L/2, j0=(i+c)%2;
+  int tb = j0 ? M-1 : 0, jb = j0 ? L-1 : 0, nl, nr;
+  npy_int32 v[9];
+  color_t *__restrict row = x + i*L;
+  const color_t *__restrict up = x + ((i-1+L)%L)*L;
+  const color_t *__restrict dn = x + ((i+1)%L)*L;
+
+  for (t = 0; t < 9; t++) v[t] = w[t];
+
+  /* interior sites */
+  for (t = 1-j0; t < M-j0; t++) {
+    j = j0 + 2*t;
+    s = row[j];
+    q = (int) (((u[M+t] >> 16) * (npy_uint32) Q) >> 16);
+    E = (s == up[j]) + (s == dn[j]) + (s == row[j-1]) + (s == row[j+1])
+      - (q == up[j]) - (q == dn[j]) - (q == row[j-1]) - (q == row[j+1]);
+    a = (npy_int32) (u[t] >> 2) < potts_threshold(E+4, v);
+    u[t] = (npy_uint32) (s + a*(q-s));
+    e += a*E;
+    acc += a;
+  }
+
+  /* site whose horizontal neighbor wraps around */
+  s  = row[jb];
+  nl = row[(jb-1+L)%L];
+  nr = row[(jb+1)%L];
+  q  = (int) (((u[M+tb] >> 16) * (npy_uint32) Q) >> 16);
+  E  = (s == up[jb]) + (s == dn[jb]) + (s == nl) + (s == nr)
+     - (q == up[jb]) - (q == dn[jb]) - (q == nl) - (q == nr);
+  a  = (npy_int32) (u[tb] >> 2) < potts_threshold(E+4, v);
+  u[tb] = (npy_uint32) (s + a*(q-s));
+  e += a*E;
+  acc += a;
+
+  for (t = 0; t < M; t++) {
+    row[j0 + 2*t] = (color_t) u[t];
+  }
+
+  *dE += e;
+
+  return acc;
+}
+
+static int potts_checkerboard(double beta, int N, int L, int Q, color_t *x, npy_uint32 *u, npy_uint64 seed, int *dE) {
+  /*
+    N checkerboard sweeps over Potts lattice x (L must be even); u is
+    a work buffer of L*L random words.
+   */
+  int i, c, n, acc=0, e=0;
+  npy_int32 w[9];
+
+  /* thresholds for energy change dE = k-4 */
+  accept_thresholds(beta, 9, 1, w);
+  
+  for (n = 0; n < N; n++) {
+    for (c = 0; c < 2; c++) {
+
+#ifdef _OPENMP
+#pragma omp parallel for reduction(+:acc,e)
+#endif
+      for (i = 0; i < L; i++) {
+	int e_row = 0;
+	rng_words(seed, (2*n+c)*L + i, u + i*L, L/2);
+	acc += potts_checkerboard_row(L, Q, x, i, c, u + i*L, w, &e_row);
+	e += e_row;
+      }
+    }
+  }
+
+  *dE = e;
+
+  return acc;
+}
+
+/*
+  Cluster algorithms for Ising (Q=0, spins +1/-1) and Potts lattices
+  (Q colors). Two neighboring sites with equal spins are bonded with
+  probability p = 1-exp(-2*beta) (Ising) or p = 1-exp(-beta) (Potts).
+  The cluster updates work on an int copy of each lattice.
+ */
+
+static void lattice_neighbors(int L, int i, int *nb) {
+  int r = i / L, c = i % L;
+
+  nb[0] = ((r-1+L)%L)*L + c;
+  nb[1] = ((r+1)%L)*L + c;
+  nb[2] = r*L + (c-1+L)%L;
+  nb[3] = r*L + (c+1)%L;
+}
+
+static int uf_find(int *parent, int i) {
+  /* root of the tree containing i (with path halving) */
+  while (parent[i] != i) {
+    parent[i] = parent[parent[i]];
+    i = parent[i];
+  }
+  return i;
+}
+
+static void uf_union(int *parent, int *size, int i, int j) {
+  /* merge trees containing i and j (union by size) */
+  int k;
+
+  i = uf_find(parent, i);
+  j = uf_find(parent, j);
+
+  if (i == j) return;
+
+  if (size[i] < size[j]) {
+    k = i; i = j; j = k;
+  }
+  parent[j] = i;
+  size[i]  += size[j];
+}
+
+static int random_spin(npy_uint64 *state, int Q) {
+  return Q ? rng_int(state, Q) : 2 * rng_int(state, 2) - 1;
+}
+
+static int swendsen_wang(double p, int N, int L, int Q, int *x, int *parent, int *size,
+			 unsigned char *bonds, npy_uint64 seed) {
+  /*
+    N Swendsen-Wang updates: bonds to the right (bit 0) and lower
+    (bit 1) neighbor are stored in a compact buffer with one byte per
+    site, clusters are found with union-find and every cluster is
+    assigned a new random spin. Returns the number of clusters.
+   */
+  int i, j, n, n_clusters=0;
+  npy_uint64 state = seed;
+
+  for (n = 0; n < N; n++) {
+
+    for (i = 0; i < L*L; i++) {
+      j = (i % L == L-1) ? i - L + 1 : i + 1;
+      bonds[i]  = (unsigned char) (x[i] == x[j] && rng_uniform(&state) < p);
+      j = (i + L) % (L*L);
+      bonds[i] |= (unsigned char) (x[i] == x[j] && rng_uniform(&state) < p) << 1;
+    }
+
+    for (i = 0; i < L*L; i++) {
+      parent[i] = i;
+      size[i]   = 1;
+    }
+
+    for (i = 0; i < L*L; i++) {
+      if (bonds[i] & 1) uf_union(parent, size, i, (i % L == L-1) ? i - L + 1 : i + 1);
+      if (bonds[i] & 2) uf_union(parent, size, i, (i + L) % (L*L));
+    }
+
+    /* new spins of the clusters are stored at their roots */
+    for (i = 0; i < L*L; i++) {
+      if (parent[i] == i) {
+	size[i] = random_spin(&state, Q);
+	n_clusters++;
+      }
+    }
+    for (i = 0; i < L*L; i++) {
+      x[i] = size[uf_find(parent, i)];
+    }
+  }
+
+  return n_clusters;
+}
+
+static int wolff(double p, int N, int L, int Q, int *x, int *stack, unsigned char *mark,
+		 npy_uint64 seed, int *dE) {
+  /*
+    N Wolff updates: a single cluster is grown from a random site and
+    flipped (Ising) or recolored (Potts). The energy change is computed
+    from the bonds on the boundary of the cluster. Returns the total
+    number of updated sites.
+   */
+  int i, k, l, n, top, old, new, nb[4], acc=0;
+  npy_uint64 state = seed;
+
+  *dE = 0;
+
+  for (n = 0; n < N; n++) {
+
+    i   = rng_int(&state, L*L);
+    old = x[i];
+    new = Q ? (old + 1 + rng_int(&state, Q-1)) % Q : -old;
+
+    stack[0] = i;
+    mark[i]  = 1;
+    top = 1;
+
+    for (k = 0; k < top; k++) {
+      lattice_neighbors(L, stack[k], nb);
+      for (l = 0; l < 4; l++) {
+	if (!mark[nb[l]] && x[nb[l]] == old && rng_uniform(&state) < p) {
+	  mark[nb[l]]  = 1;
+	  stack[top++] = nb[l];
+	}
+      }
+    }
+
+    for (k = 0; k < top; k++) {
+      lattice_neighbors(L, stack[k], nb);
+      for (l = 0; l < 4; l++) {
+	if (!mark[nb[l]]) {
+	  *dE += Q ? delta(old, x[nb[l]]) - delta(new, x[nb[l]]) : 2 * old * x[nb[l]];
+	}
+      }
+    }
+
+    for (k = 0; k < top; k++) {
+      x[stack[k]]    = new;
+      mark[stack[k]] = 0;
+    }
+    acc += top;
+  }
+
+  return acc;
+}
+
+static int lattice_energy(int potts, int L, char *x) {
+  return potts ? potts_lattice_energy(L, (color_t*) x) : ising_lattice_energy(L, (spin_t*) x);
+}
+
+static void lattice_load(int potts, int n, char *x, int *y) {
+  /* copy a byte lattice into an int work buffer */
+  int i;
+  for (i = 0; i < n; i++) {
+    y[i] = potts ? ((color_t*) x)[i] : ((spin_t*) x)[i];
+  }
+}
+
+static void lattice_store(int potts, int n, int *y, char *x) {
+  int i;
+  for (i = 0; i < n; i++) {
+    if (potts) ((color_t*) x)[i] = (color_t) y[i];
+    else ((spin_t*) x)[i] = (spin_t) y[i];
+  }
+}
+
+static PyObject *cluster_sample(PyObject *args, int potts, int use_wolff) {
+  /*
+    Common wrapper of the Swendsen-Wang and Wolff samplers
+   */
+  PyArrayObject *arr, *acc, *seed_arr;
+  PyObject *E_obj = NULL;
+  int L, Q=0, N, dE, *y, *a, *parent, *size;
+  char *x;
+  npy_intp k, n_paths;
+  npy_uint64 *seeds;
+  unsigned char *bonds;
+  double beta, p, *E;
+  int ok;
+
+  if (potts) {
+    ok = PyArg_ParseTuple(args, "diiiO!O!|O", &beta, &N, &L, &Q,
+			  &PyArray_Type, &arr, &PyArray_Type, &seed_arr, &E_obj);
+  }
+  else {
+    ok = PyArg_ParseTuple(args, "diiO!O!|O", &beta, &N, &L,
+			  &PyArray_Type, &arr, &PyArray_Type, &seed_arr, &E_obj);
+  }
+  if (!ok) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array and seeds required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  if (PyArray_SIZE(arr) % (L*L)) {
+    PyErr_SetString(PyExc_ValueError, "array of shape (n_paths, L*L) required");
+    return NULL;
+  }
+
+  n_paths = PyArray_SIZE(arr) / (L*L);
+  seeds = rng_seeds(seed_arr, n_paths);
+  if (seeds == NULL || !get_energies(E_obj, n_paths, &E)) return NULL;
+
+  acc = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (acc == NULL) return NULL;
+
+  parent = (int*) malloc(3 * L*L * sizeof(int));
+  bonds  = (unsigned char*) calloc(L*L, 1);
+  if (parent == NULL || bonds == NULL) {
+    free(parent);
+    free(bonds);
+    Py_DECREF(acc);
+    return PyErr_NoMemory();
+  }
+  size = parent + L*L;
+  y    = parent + 2*L*L;
+
+  x = arr->data;
+  a = (int*) acc->data;
+  p = 1. - exp(-(potts ? 1. : 2.) * beta);
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    lattice_load(potts, L*L, x + k*L*L, y);
+    if (use_wolff) {
+      a[k] = wolff(p, N, L, Q, y, parent, bonds, seeds[k], &dE);
+    }
+    else {
+      dE   = -lattice_energy(potts, L, x + k*L*L);
+      a[k] = swendsen_wang(p, N, L, Q, y, parent, size, bonds, seeds[k]);
+    }
+    lattice_store(potts, L*L, y, x + k*L*L);
+    if (!use_wolff) dE += lattice_energy(potts, L, x + k*L*L);
+    if (E) E[k] += dE;
+  }
+  Py_END_ALLOW_THREADS
+
+  free(parent);
+  free(bonds);
+
+  return PyArray_Return(acc);
+}
+
+static PyObject *ising_swendsen_wang(PyObject *self, PyObject *args) { 
+  return cluster_sample(args, 0, 0);
+}
+
+static PyObject *potts_swendsen_wang(PyObject *self, PyObject *args) { 
+  return cluster_sample(args, 1, 0);
+}
+
+static PyObject *ising_wolff(PyObject *self, PyObject *args) { 
+  return cluster_sample(args, 0, 1);
+}
+
+static PyObject *potts_wolff(PyObject *self, PyObject *args) { 
+  return cluster_sample(args, 1, 1);
+}
+
+static PyObject *ising_sample(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr;
+  int L, N, acc, dE;
+  spin_t *x;
+  double beta;
+  unsigned PY_LONG_LONG seed;
+
+  if (!(PyArg_ParseTuple(args, "diiO!K", &beta, &N, &L, &PyArray_Type, &arr, &seed))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array and seed required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  x = (spin_t*) arr->data;
+  
+  Py_BEGIN_ALLOW_THREADS
+  acc = ising_metropolis(beta, N, L, x, seed, &dE);
+  Py_END_ALLOW_THREADS
+
   return Py_BuildValue("i", acc);
 }
 
+static PyObject *ising_sample_batch(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr, *acc, *seed_arr;
+  PyObject *E_obj = NULL;
+  int L, N, dE, *a;
+  spin_t *x;
+  npy_intp k, n_paths;
+  npy_uint64 *seeds;
+  double beta, *E;
+
+  if (!(PyArg_ParseTuple(args, "diiO!O!|O", &beta, &N, &L,
+			 &PyArray_Type, &arr,
+			 &PyArray_Type, &seed_arr, &E_obj))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array and seeds required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  if (arr->nd != 2 || arr->dimensions[1] != L*L) {
+    PyErr_SetString(PyExc_ValueError, "array of shape (n_paths, L*L) required");
+    return NULL;
+  }
+
+  n_paths = arr->dimensions[0];
+  seeds = rng_seeds(seed_arr, n_paths);
+  if (seeds == NULL || !get_energies(E_obj, n_paths, &E)) return NULL;
+
+  acc = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (acc == NULL) return NULL;
+
+  x = (spin_t*) arr->data;
+  a = (int*) acc->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    a[k] = ising_metropolis(beta, N, L, x + k*L*L, seeds[k], &dE);
+    if (E) E[k] += dE;
+  }
+  Py_END_ALLOW_THREADS
+  
+  return PyArray_Return(acc);
+}
+
+static PyObject *potts_sample(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr;
+  int L, Q, N, acc, dE;
+  color_t *x;
+  double beta;
+  unsigned PY_LONG_LONG seed;
+
+  if (!(PyArg_ParseTuple(args, "diiiO!K", &beta, &N, &L, &Q, &PyArray_Type, &arr, &seed))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array and seed required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  x = (color_t*) arr->data;
+  
+  Py_BEGIN_ALLOW_THREADS
+  acc = potts_metropolis(beta, N, L, Q, x, seed, &dE);
+  Py_END_ALLOW_THREADS
+
+  return Py_BuildValue("i", acc);
+}
+
+static PyObject *potts_sample_batch(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr, *acc, *seed_arr;
+  PyObject *E_obj = NULL;
+  int L, Q, N, dE, *a;
+  color_t *x;
+  npy_intp k, n_paths;
+  npy_uint64 *seeds;
+  double beta, *E;
+
+  if (!(PyArg_ParseTuple(args, "diiiO!O!|O", &beta, &N, &L, &Q,
+			 &PyArray_Type, &arr,
+			 &PyArray_Type, &seed_arr, &E_obj))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array and seeds required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  if (arr->nd != 2 || arr->dimensions[1] != L*L) {
+    PyErr_SetString(PyExc_ValueError, "array of shape (n_paths, L*L) required");
+    return NULL;
+  }
+
+  n_paths = arr->dimensions[0];
+  seeds = rng_seeds(seed_arr, n_paths);
+  if (seeds == NULL || !get_energies(E_obj, n_paths, &E)) return NULL;
+
+  acc = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (acc == NULL) return NULL;
+
+  x = (color_t*) arr->data;
+  a = (int*) acc->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    a[k] = potts_metropolis(beta, N, L, Q, x + k*L*L, seeds[k], &dE);
+    if (E) E[k] += dE;
+  }
+  Py_END_ALLOW_THREADS
+  
+  return PyArray_Return(acc);
+}
+
+static PyObject *ising_sweep(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr, *acc, *seed_arr;
+  PyObject *E_obj = NULL;
+  int L, N, dE, *a;
+  spin_t *x;
+  npy_intp k, n_paths;
+  npy_uint64 *seeds;
+  npy_uint32 *u;
+  double beta, *E;
+
+  if (!(PyArg_ParseTuple(args, "diiO!O!|O", &beta, &N, &L,
+			 &PyArray_Type, &arr,
+			 &PyArray_Type, &seed_arr, &E_obj))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array and seeds required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  if (L % 2 || PyArray_SIZE(arr) % (L*L)) {
+    PyErr_SetString(PyExc_ValueError, "even L and (n_paths, L*L) array required");
+    return NULL;
+  }
+
+  n_paths = PyArray_SIZE(arr) / (L*L);
+  seeds = rng_seeds(seed_arr, n_paths);
+  if (seeds == NULL || !get_energies(E_obj, n_paths, &E)) return NULL;
+
+  acc = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (acc == NULL) return NULL;
+
+  u = (npy_uint32*) malloc(L*(L/2+1) * sizeof(npy_uint32));
+  if (u == NULL) {
+    Py_DECREF(acc);
+    return PyErr_NoMemory();
+  }
+
+  x = (spin_t*) arr->data;
+  a = (int*) acc->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    a[k] = ising_checkerboard(beta, N, L, x + k*L*L, u, seeds[k], &dE);
+    if (E) E[k] += dE;
+  }
+  Py_END_ALLOW_THREADS
+
+  free(u);
+  
+  return PyArray_Return(acc);
+}
+
+static PyObject *potts_sweep(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr, *acc, *seed_arr;
+  PyObject *E_obj = NULL;
+  int L, Q, N, dE, *a;
+  color_t *x;
+  npy_intp k, n_paths;
+  npy_uint64 *seeds;
+  npy_uint32 *u;
+  double beta, *E;
+
+  if (!(PyArg_ParseTuple(args, "diiiO!O!|O", &beta, &N, &L, &Q,
+			 &PyArray_Type, &arr,
+			 &PyArray_Type, &seed_arr, &E_obj))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8/uint8 array and seeds required");
+    return NULL;
+  }
+
+  if (!check_states(arr)) return NULL;
+
+  if (L % 2 || PyArray_SIZE(arr) % (L*L)) {
+    PyErr_SetString(PyExc_ValueError, "even L and (n_paths, L*L) array required");
+    return NULL;
+  }
+
+  n_paths = PyArray_SIZE(arr) / (L*L);
+  seeds = rng_seeds(seed_arr, n_paths);
+  if (seeds == NULL || !get_energies(E_obj, n_paths, &E)) return NULL;
+
+  acc = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (acc == NULL) return NULL;
+
+  u = (npy_uint32*) malloc(L*L * sizeof(npy_uint32));
+  if (u == NULL) {
+    Py_DECREF(acc);
+    return PyErr_NoMemory();
+  }
+
+  x = (color_t*) arr->data;
+  a = (int*) acc->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    a[k] = potts_checkerboard(beta, N, L, Q, x + k*L*L, u, seeds[k], &dE);
+    if (E) E[k] += dE;
+  }
+  Py_END_ALLOW_THREADS
+
+  free(u);
+  
+  return PyArray_Return(acc);
+}
+
+static PyObject *ising_pack(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *x_arr, *p_arr;
+  int i, j, L, W;
+  spin_t *x;
+  npy_intp k, n_paths;
+  npy_uint64 *p;
+
+  if (!(PyArg_ParseTuple(args, "iO!O!", &L,
+			 &PyArray_Type, &x_arr,
+			 &PyArray_Type, &p_arr))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous int8 and uint64 arrays required");
+    return NULL;
+  }
+
+  if (!check_states(x_arr) || !check_packed(p_arr, L)) return NULL;
+
+  W = (L+63)/64;
+  n_paths = PyArray_SIZE(x_arr) / (L*L);
+
+  if (PyArray_SIZE(p_arr) != n_paths * L * W) {
+    PyErr_SetString(PyExc_ValueError, "packed array has wrong size");
+    return NULL;
+  }
+
+  x = (spin_t*) x_arr->data;
+  p = (npy_uint64*) p_arr->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths * L * W; k++) {
+    p[k] = 0;
+  }
+  for (k = 0; k < n_paths; k++) {
+    for (i = 0; i < L; i++) {
+      for (j = 0; j < L; j++) {
+	if (x[(k*L + i)*L + j] > 0) {
+	  p[(k*L + i)*W + j/64] |= 1ULL << (j%64);
+	}
+      }
+    }
+  }
+  Py_END_ALLOW_THREADS
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *ising_unpack(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *x_arr, *p_arr;
+  int i, j, L, W;
+  spin_t *x;
+  npy_intp k, n_paths;
+  npy_uint64 *p;
+
+  if (!(PyArg_ParseTuple(args, "iO!O!", &L,
+			 &PyArray_Type, &p_arr,
+			 &PyArray_Type, &x_arr))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous uint64 and int8 arrays required");
+    return NULL;
+  }
+
+  if (!check_states(x_arr) || !check_packed(p_arr, L)) return NULL;
+
+  W = (L+63)/64;
+  n_paths = PyArray_SIZE(x_arr) / (L*L);
+
+  if (PyArray_SIZE(p_arr) != n_paths * L * W) {
+    PyErr_SetString(PyExc_ValueError, "packed array has wrong size");
+    return NULL;
+  }
+
+  x = (spin_t*) x_arr->data;
+  p = (npy_uint64*) p_arr->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    for (i = 0; i < L; i++) {
+      for (j = 0; j < L; j++) {
+	x[(k*L + i)*L + j] = (p[(k*L + i)*W + j/64] >> (j%64)) & 1ULL ? 1 : -1;
+      }
+    }
+  }
+  Py_END_ALLOW_THREADS
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *packed_energy(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr, *E_arr;
+  int L, W, *E;
+  npy_intp k, n_paths;
+  npy_uint64 *x, *buf;
+
+  if (!(PyArg_ParseTuple(args, "iO!", &L, &PyArray_Type, &arr))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous uint64 array required");
+    return NULL;
+  }
+
+  if (!check_packed(arr, L)) return NULL;
+
+  W = (L+63)/64;
+  n_paths = PyArray_SIZE(arr) / (L*W);
+
+  E_arr = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (E_arr == NULL) return NULL;
+
+  buf = (npy_uint64*) malloc(2*W * sizeof(npy_uint64));
+  if (buf == NULL) {
+    Py_DECREF(E_arr);
+    return PyErr_NoMemory();
+  }
+
+  x = (npy_uint64*) arr->data;
+  E = (int*) E_arr->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    E[k] = packed_ising_energy(L, x + k*L*W, buf);
+  }
+  Py_END_ALLOW_THREADS
+
+  free(buf);
+
+  return PyArray_Return(E_arr);
+}
+
+static PyObject *packed_sweep(PyObject *self, PyObject *args) { 
+
+  PyArrayObject *arr, *acc, *seed_arr;
+  PyObject *E_obj = NULL;
+  int L, W, N, dE, *a;
+  npy_intp k, n_paths;
+  npy_uint64 *x, *buf, *seeds;
+  double beta, *E;
+
+  if (!(PyArg_ParseTuple(args, "diiO!O!|O", &beta, &N, &L,
+			 &PyArray_Type, &arr,
+			 &PyArray_Type, &seed_arr, &E_obj))) {
+    PyErr_SetString(PyExc_TypeError, "contiguous uint64 array and seeds required");
+    return NULL;
+  }
+
+  if (!check_packed(arr, L)) return NULL;
+
+  W = (L+63)/64;
+
+  if (L % 2 || PyArray_SIZE(arr) % (L*W)) {
+    PyErr_SetString(PyExc_ValueError, "even L and (n_paths, L*W) array required");
+    return NULL;
+  }
+
+  n_paths = PyArray_SIZE(arr) / (L*W);
+  seeds = rng_seeds(seed_arr, n_paths);
+  if (seeds == NULL || !get_energies(E_obj, n_paths, &E)) return NULL;
+
+  acc = (PyArrayObject*) PyArray_SimpleNew(1, &n_paths, NPY_INT);
+  if (acc == NULL) return NULL;
+
+  buf = (npy_uint64*) malloc(2*W * sizeof(npy_uint64));
+  if (buf == NULL) {
+    Py_DECREF(acc);
+    return PyErr_NoMemory();
+  }
+
+  x = (npy_uint64*) arr->data;
+  a = (int*) acc->data;
+
+  Py_BEGIN_ALLOW_THREADS
+  for (k = 0; k < n_paths; k++) {
+    a[k] = packed_ising_checkerboard(beta, N, L, x + k*L*W, buf, seeds[k], &dE);
+    if (E) E[k] += dE;
+  }
+  Py_END_ALLOW_THREADS
+
+  free(buf);
+  
+  return PyArray_Return(acc);
+}
+
 static PyMethodDef methods[] = {
   {"ising_energy", (PyCFunction) ising_energy, 1},
   {"ising_sample", (PyCFunction) ising_sample, 1},
+  {"ising_sample_batch", (PyCFunction) ising_sample_batch, 1},
+  {"ising_sweep", (PyCFunction) ising_sweep, 1},
   {"potts_energy", (PyCFunction) potts_energy, 1},
   {"potts_sample", (PyCFunction) potts_sample, 1},
+  {"potts_sample_batch", (PyCFunction) potts_sample_batch, 1},
+  {"potts_sweep", (PyCFunction) potts_sweep, 1},
   {"rbm_energy", (PyCFunction) rbm_energy, 1},
+  {"ising_energy_batch", (PyCFunction) ising_energy_batch, 1},
+  {"potts_energy_batch", (PyCFunction) potts_energy_batch, 1},
+  {"ising_swendsen_wang", (PyCFunction) ising_swendsen_wang, 1},
+  {"potts_swendsen_wang", (PyCFunction) potts_swendsen_wang, 1},
+  {"ising_wolff", (PyCFunction) ising_wolff, 1},
+  {"potts_wolff", (PyCFunction) potts_wolff, 1},
+  {"ising_pack", (PyCFunction) ising_pack, 1},
+  {"ising_unpack", (PyCFunction) ising_unpack, 1},
+  {"packed_energy", (PyCFunction) packed_energy, 1},
+  {"packed_sweep", (PyCFunction) packed_sweep, 1},
   {NULL, NULL}
 };
 
@@ -1,5 +1,6 @@
 import time
 import contextlib
+import numpy as np
 
 def format_time(t):
 
@@ -17,12 +18,32 @@ def take_time(desc):
     print '{0} took {1}'.format(desc, format_time(dt))
 
 
+def random_state(rng=None):
+    """
+    Random number generator: None returns numpy's global generator, an
+    integer seeds a new numpy.random.RandomState and a RandomState is
+    returned as is
+    """
+    if rng is None:
+        return np.random.mtrand._rand
+    if isinstance(rng, (int, long, np.integer)):
+        return np.random.RandomState(rng)
+    return rng
+
+def chain_seeds(rng=None, n=None):
+    """
+    Draw 64 bit seeds for the random number generators of the C
+    kernels, one for each of 'n' chains (or a single seed if n is None)
+    """
+    seeds = random_state(rng).randint(2**64-1, size=n, dtype=np.uint64)
+    return long(seeds) if n is None else seeds
+
 class Model(object):
     """Model
 
     Probabilistic model
     """
-    def sample(self, x=None, n=None):
+    def sample(self, x=None, n=None, rng=None):
         raise NotImplementedError
 
     def energy(self, x):
@@ -31,14 +52,27 @@ class Model(object):
         """
         raise NotImplementedError
 
+    def sample_paths(self, n_paths, rng=None):
+        """
+        Draw independent initial states for 'n_paths' paths. Tempered
+        models can only be sampled exactly at beta=0 (e.g. random
+        lattices), so a ValueError is raised at other inverse
+        temperatures. Models with exact samplers override this method.
+        """
+        if self.beta != 0.:
+            msg = 'initial states can only be drawn at beta=0, not at beta={0}'
+            raise ValueError(msg.format(self.beta))
+        return self.sample(beta=0., size=int(n_paths), rng=rng)
+
 class Kernel(object):
     """Kernel
     
     Markov transition kernel
     """
-    def __call__(self, x):
+    def __call__(self, x, rng=None):
         """
-        Transition starting from given state 'x'
+        Transition starting from given state 'x' using random number
+        generator 'rng' (see random_state)
         """
         raise NotImplementedError
 
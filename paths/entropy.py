@@ -43,6 +43,59 @@ class Entropy(object):
         p  = np.exp(p)
         
         return np.dot(p, self.E)
+
+    def E_var(self, beta):
+        """
+        Variance of the energy (heat capacity / beta**2)
+        """
+        p  = -beta * self.E + self.s
+        p -= log_sum_exp(p)
+        p  = np.exp(p)
+
+        return np.dot(p, (self.E - np.dot(p, self.E))**2)
+
+class ThermodynamicScheduler(object):
+    """ThermodynamicScheduler
+
+    Finds inverse temperatures that are equally spaced in thermodynamic
+    length, i.e. the integral of the standard deviation of the energy
+    over the inverse temperature, which is computed from the exact
+    microcanonical entropy. 
+    """
+    def __init__(self, entropy, beta_min=0., beta_max=1.):
+        """
+        Parameters
+        ----------
+        entropy : Entropy
+          microcanonical entropy of the model (e.g. IsingEntropy)
+
+        beta_min, beta_max : float
+          inverse temperatures at which the schedule starts and ends
+        """
+        self.entropy  = entropy
+        self.beta_min = float(beta_min)
+        self.beta_max = float(beta_max)
+
+    def length(self, beta):
+        """
+        Thermodynamic length accumulated between beta_min and the
+        inverse temperatures 'beta' (sorted)
+        """
+        std  = np.sqrt(map(self.entropy.E_var, beta))
+        incr = 0.5 * (std[1:] + std[:-1]) * np.diff(beta)
+
+        return np.append(0., np.add.accumulate(incr))
+
+    def find_schedule(self, length_bridge, n_grid=1000):
+        """
+        Returns 'length_bridge' + 1 inverse temperatures with equal
+        thermodynamic distance between successive values
+        """
+        grid   = np.linspace(self.beta_min, self.beta_max, int(n_grid))
+        length = self.length(grid)
+        target = np.linspace(0., length[-1], int(length_bridge) + 1)
+
+        return np.interp(target, length, grid)
     
 class IsingEntropy(Entropy):
     """IsingEntropy
@@ -77,3 +77,33 @@ def histogram(w_f, w_r, n_iter=1e5, tol=1e-10, alpha=0., return_histogram=False)
         return p.log_Z(-alpha)-p.log_Z(1-alpha), p
     else:
         return p.log_Z(-alpha)-p.log_Z(1-alpha)
+
+def jarzynski_error(w):
+    """
+    Asymptotic standard error of the Jarzynski estimator. The error is
+    estimated from the same weights, so it is unreliable if the weights
+    are dominated by a few paths (small effective sample size, see
+    paths.resampling.ess): the estimate is then biased while the error
+    can be much too small.
+    """
+    v = np.exp(w.min() - w)
+    return np.std(v) / np.mean(v) / np.sqrt(len(w))
+
+def bar_error(w_f, w_r, dF=None, n_f=None, n_r=None):
+    """
+    Asymptotic standard error of Bennett's acceptance ratio (arguments
+    as in bar). 'n_f' and 'n_r' are the effective numbers of
+    independent forward and reverse paths (default: number of paths),
+    which are smaller if, for example, the reverse paths start from
+    resampled forward states.
+    """
+    dF  = bar(w_f, w_r) if dF is None else dF
+    n_f = len(w_f) if n_f is None else n_f
+    n_r = len(w_r) if n_r is None else n_r
+    f_f = 1 / (1 + np.exp(+w_f - dF))
+    f_r = 1 / (1 + np.exp(-w_r + dF))
+
+    var = (np.mean(f_f**2) / np.mean(f_f)**2 - 1) / n_f + \
+          (np.mean(f_r**2) / np.mean(f_r)**2 - 1) / n_r
+
+    return np.sqrt(max(var, 0.))
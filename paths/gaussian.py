@@ -1,8 +1,10 @@
+import os
+import hashlib
 import numpy as np
 
 from scipy import optimize
 
-from .core import Model, Kernel
+from .core import Model, Kernel, random_state
 
 class Gaussian(Model):
     """Gaussian
@@ -20,11 +22,17 @@ class Gaussian(Model):
         self.mu    = float(mu)
         self.sigma = float(sigma)
 
-    def sample(self, x=None, n=None):
+    def sample(self, x=None, n=None, rng=None):
         """
         Generate a sample (x will be ignored)
         """
-        return np.random.standard_normal(n) * self.sigma + self.mu
+        return random_state(rng).standard_normal(n) * self.sigma + self.mu
+
+    def sample_paths(self, n_paths, rng=None):
+        """
+        Exact samples, one per path
+        """
+        return self.sample(n=int(n_paths), rng=rng)
 
     def energy(self, x):
         """
@@ -100,8 +108,8 @@ class GaussianKernel(Kernel):
         return 'GaussianKernel(tau={0:.3e}, mu={1:.2f}, sigma={2:.2f})'.format(
             self.tau, self._mu, self._sigma)
 
-    def __call__(self, x):
-        return np.random.standard_normal(np.shape(x)) * self.sigma + self.mu(x)
+    def __call__(self, x, rng=None):
+        return random_state(rng).standard_normal(np.shape(x)) * self.sigma + self.mu(x)
 
     def compose(self, other):
 
@@ -143,6 +151,33 @@ class Bridge(GaussianKernel):
 
         super(Bridge, self).__init__(self.tau) 
 
+    @classmethod
+    def stationary_moments(cls, beta, initial_kernel, target_kernel):
+        """
+        Means and variances of the stationary distributions for an array
+        of inverse temperatures and their derivatives with respect to
+        the inverse temperature
+
+        Returns
+        -------
+        mu, var, dmu, dvar : arrays
+        """
+        beta = np.asarray(beta, dtype='d')
+        
+        tau0, mu0, s0 = initial_kernel.tau, initial_kernel._mu, initial_kernel._sigma
+        tau1, mu1, s1 = target_kernel.tau, target_kernel._mu, target_kernel._sigma
+
+        tau  = (1-beta) * tau0 + beta * tau1
+        dtau = tau1 - tau0
+
+        mu   = ((1-beta) * (1-tau0) * mu0 + beta * (1-tau1) * mu1) / (1-tau)
+        dmu  = ((1-tau1) * mu1 - (1-tau0) * mu0 + mu * dtau) / (1-tau)
+
+        var  = ((1-beta) * (1-tau0**2) * s0**2 + beta * (1-tau1**2) * s1**2) / (1-tau**2)
+        dvar = ((1-tau1**2) * s1**2 - (1-tau0**2) * s0**2 + 2 * var * tau * dtau) / (1-tau**2)
+
+        return mu, var, dmu, dvar
+
     @property
     def _mu(self):
 
@@ -205,12 +240,103 @@ class GeometricBridge(Bridge):
     def _sigma(self, value):
         pass
 
+    @classmethod
+    def stationary_moments(cls, beta, initial_kernel, target_kernel):
+
+        beta = np.asarray(beta, dtype='d')
+        
+        mu0, s0 = initial_kernel._mu, initial_kernel._sigma
+        mu1, s1 = target_kernel._mu, target_kernel._sigma
+
+        var  = 1 / ((1-beta) / s0**2 + beta / s1**2)
+        dvar = - var**2 * (1 / s1**2 - 1 / s0**2)
+
+        eta  = (1-beta) * mu0 / s0**2 + beta * mu1 / s1**2
+        mu   = var * eta
+        dmu  = dvar * eta + var * (mu1 / s1**2 - mu0 / s0**2)
+
+        return mu, var, dmu, dvar
+
+class CompiledBridge(object):
+    """CompiledBridge
+
+    Sequence of Gaussian kernels stored as parameter arrays: relaxation
+    times 'tau', means 'mu' and standard deviations 'sigma' of the
+    stationary distributions. Simulations along a compiled bridge run
+    as a vectorized loop over the arrays (see paths.simulate).
+    Indexing with an integer returns a GaussianKernel, slicing returns
+    a compiled bridge.
+    """
+    def __init__(self, tau, mu, sigma, beta=None):
+
+        self.tau   = np.array(tau, dtype='d')
+        self.mu    = np.array(mu, dtype='d')
+        self.sigma = np.array(sigma, dtype='d')
+        self.beta  = None if beta is None else np.array(beta, dtype='d')
+
+    @classmethod
+    def from_kernels(cls, kernels):
+        """
+        Compile a sequence of Gaussian kernels
+        """
+        params = np.array([(T.tau, T._mu, T._sigma) for T in kernels])
+        beta   = [getattr(T, 'beta', None) for T in kernels]
+        beta   = None if None in beta else beta
+
+        return cls(params[:,0], params[:,1], params[:,2], beta)
+
+    def __len__(self):
+        return len(self.tau)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            beta = None if self.beta is None else self.beta[index]
+            return CompiledBridge(self.tau[index], self.mu[index], self.sigma[index], beta)
+        return GaussianKernel(self.tau[index], self.mu[index], self.sigma[index])
+
+    def power(self, n):
+        return CompiledBridge(self.tau**n, self.mu, self.sigma, self.beta)
+
+    @property
+    def stationary(self):
+        """
+        Stationary distributions of all kernels
+        """
+        return [Gaussian(mu, sigma) for mu, sigma in zip(self.mu, self.sigma)]
+
+SCHEDULE_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'paths', 'schedules.npz')
+
 class Scheduler(object):
+    """Scheduler
+
+    Finds inverse temperatures such that successive stationary
+    distributions have a constant relative entropy. If the bridge
+    constructor provides 'stationary_moments', the objective and its
+    gradient are evaluated in closed form and optimized with L-BFGS,
+    otherwise the relative entropies are computed from the stationary
+    distributions ('kl' method) and the gradient is approximated by
+    finite differences. Optimized schedules are stored in an on-disk
+    cache.
+    """
+    _memo = {}
+
+    def __init__(self, start, end, bridge_constructor=Bridge, cache=SCHEDULE_CACHE):
+        """
+        Parameters
+        ----------
+        start, end : GaussianKernel
+          initial and target kernel
 
-    def __init__(self, start, end, bridge_constructor=Bridge):
+        bridge_constructor :
+          e.g. Bridge, GeometricBridge or MultivariateBridge
 
+        cache : string or None
+          name of the file storing optimized schedules (None disables
+          caching)
+        """
         self.start = start
         self.end   = end
+        self.cache = cache
 
         self._bridge = bridge_constructor
 
@@ -218,20 +344,242 @@ class Scheduler(object):
         incr = incr**2
         return np.append(0, np.add.accumulate(incr)/incr.sum())
 
+    @property
+    def analytic(self):
+        return hasattr(self._bridge, 'stationary_moments')
+
+    def kl(self, beta):
+        """
+        Relative entropies between successive stationary distributions
+        and their derivatives with respect to both inverse temperatures
+        (None if the moments are not available in closed form)
+        """
+        if not self.analytic:
+            prob = [self._bridge(b, self.start, self.end).stationary for b in beta]
+            return np.array([p.kl(q) for p, q in zip(prob, prob[1:])]), None
+
+        mu, var, dmu, dvar = self._bridge.stationary_moments(beta, self.start, self.end)
+
+        d  = mu[:-1] - mu[1:]
+        v0 = var[:-1]
+        v1 = var[1:]
+
+        kl  = 0.5 * ((v0 + d**2) / v1 - 1 + np.log(v1 / v0))
+        dkl = (d / v1 * dmu[:-1] + 0.5 * (1 / v1 - 1 / v0) * dvar[:-1],
+               -d / v1 * dmu[1:] + 0.5 * (1 / v1 - (v0 + d**2) / v1**2) * dvar[1:])
+
+        return kl, dkl
+
+    def objective(self, x):
+        """
+        Squared coefficient of variation of the relative entropies and
+        its gradient with respect to the increments (None if not
+        available in closed form)
+        """
+        beta = self.schedule(x)
+
+        kl, dkl = self.kl(beta)
+
+        m = kl.mean()
+        r = kl / m - 1
+        f = np.sum(r**2)
+
+        if dkl is None:
+            return f, None
+
+        dkl0, dkl1 = dkl
+
+        ## gradient with respect to the relative entropies and the schedule
+
+        g = 2 * r / m - 2 * np.dot(r, kl) / m**2 / len(kl)
+        g_beta = np.zeros(len(beta))
+        g_beta[:-1] += g * dkl0
+        g_beta[1:]  += g * dkl1
+
+        ## gradient with respect to the increments: beta_j = S_j / S with
+        ## S_j the sum of the first j squared increments
+
+        S    = np.sum(x**2)
+        tail = np.add.accumulate(g_beta[::-1])[::-1][1:]
+        grad = 2 * x / S * (tail - np.dot(g_beta, beta))
+
+        return f, grad
+
     def __call__(self, x):
+        return self.objective(x)[0]
 
-        bridge = [self._bridge(beta, self.start, self.end)
-                  for beta in self.schedule(x)]
-        prob   = [T.stationary for T in bridge]
+    def gradient(self, x):
+        return self.objective(x)[1]
 
-        kl = np.array([p.kl(q) for p, q in zip(prob,prob[1:])])
+    def key(self, length_bridge):
+        """
+        Cache key built from the bridge type, the length of the bridge
+        and a digest of the relaxation times and the parameters of the
+        stationary distributions of the initial and target kernel
+        """
+        digest = hashlib.sha1()
+        for kernel in (self.start, self.end):
+            p = kernel.stationary
+            values = [getattr(kernel, 'tau', 0.)] + \
+                     [getattr(p, name) for name in sorted(vars(p)) if not name.startswith('_')]
+            for value in values:
+                digest.update(np.ascontiguousarray(value, dtype='d').tostring())
+
+        return '{0}_{1}_{2}'.format(self._bridge.__name__, int(length_bridge),
+                                    digest.hexdigest())
+
+    def load(self, key):
+
+        memo = Scheduler._memo.get((self.cache, key))
+        if memo is not None or self.cache is None or not os.path.exists(self.cache):
+            return memo
+
+        with np.load(self.cache) as cache:
+            for name in cache.files:
+                Scheduler._memo[(self.cache, name)] = cache[name]
+
+        return Scheduler._memo.get((self.cache, key))
+
+    def store(self, key, schedule):
+
+        Scheduler._memo[(self.cache, key)] = schedule
+
+        if self.cache is None: return
+
+        data = {}
+        if os.path.exists(self.cache):
+            with np.load(self.cache) as cache:
+                data.update((name, cache[name]) for name in cache.files)
+        data[key] = schedule
+
+        try:
+            if not os.path.exists(os.path.dirname(self.cache)):
+                os.makedirs(os.path.dirname(self.cache))
+            tmp = self.cache + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.savez(f, **data)
+            os.rename(tmp, self.cache)
+        except (IOError, OSError):
+            pass
 
-        return np.sum((kl-kl.mean())**2)
-        
     def find_schedule(self, length_bridge):
 
-        x = np.ones(int(length_bridge))
-        y = optimize.fmin_powell(self, x)
+        key = self.key(length_bridge)
+        schedule = self.load(key)
+
+        if schedule is None:
+            x = np.ones(int(length_bridge))
+            if self.analytic:
+                y = optimize.fmin_l_bfgs_b(self.objective, x, factr=10., pgtol=1e-10,
+                                           maxiter=10000)[0]
+            else:
+                y = optimize.fmin_l_bfgs_b(self, x, approx_grad=True, factr=10.,
+                                           pgtol=1e-10, maxiter=10000)[0]
+            schedule = self.schedule(y)
+            self.store(key, schedule)
+
+        return schedule.copy()
+        
+def work_statistics(bridge, n_paths=1):
+    """
+    Exact statistics of the forward work along a Gaussian bridge,
+    computed in O(K) for a bridge of length K.
+
+    Parameters
+    ----------
+    bridge : list of GaussianKernels or CompiledBridge
+      bridge, e.g. obtained with make_bridge
+
+    n_paths : integer
+      number of paths used by the Jarzynski estimator
+
+    Returns
+    -------
+    dict with the keys
+
+      q_mu, q_sigma : means and standard deviations of the marginal
+        distributions of the states after each stage
+
+      mean, var : mean and variance of the work
+
+      log_Z : log ratio of the normalization constants of the final
+        and initial distribution, log <exp(-W)>
+
+      dissipation : mean work + log_Z
+
+      relative_variance : relative variance of the weights exp(-W)
+        (inf if the second moment does not exist)
+
+      bias : leading order bias of the Jarzynski estimate of log_Z
+        obtained from 'n_paths' paths, -relative_variance / (2*n_paths)
+    """
+    if not isinstance(bridge, CompiledBridge):
+        bridge = CompiledBridge.from_kernels(bridge)
+
+    tau, mu, sigma = bridge.tau, bridge.mu, bridge.sigma
+
+    ## marginal distributions of the states along the paths
+
+    q_mu  = np.empty(len(bridge))
+    q_var = np.empty(len(bridge))
+
+    q_mu[0], q_var[0] = mu[0], sigma[0]**2
+
+    for k in range(1, len(bridge)):
+        q_mu[k]  = tau[k] * q_mu[k-1] + (1-tau[k]) * mu[k]
+        q_var[k] = tau[k]**2 * q_var[k-1] + (1-tau[k]**2) * sigma[k]**2
+
+    ## work increment of stage k is the quadratic a*x**2 + b*x + c of
+    ## the state x after stage k-1
+
+    prec = 1 / sigma**2
+    a = 0.5 * np.diff(prec)
+    b = -np.diff(mu * prec)
+    c = 0.5 * np.diff(mu**2 * prec)
+
+    m, v = q_mu[:-1], q_var[:-1]
+
+    mean = np.sum(a * (v + m**2) + b * m + c)
+
+    ## covariance of states j < l is v[j] times the product of the
+    ## relaxation times in between, which allows for summing over all
+    ## pairs of increments with a backward recursion
+
+    A = a
+    B = 2 * a * m + b
+
+    var = np.sum(2 * A**2 * v**2 + B**2 * v)
+    S1, S2 = 0., 0.
+
+    for j in range(len(m)-2, -1, -1):
+        S1 = tau[j+1] * (B[j+1] + S1)
+        S2 = tau[j+1]**2 * (A[j+1] + S2)
+        var += 2 * (B[j] * v[j] * S1 + 2 * A[j] * v[j]**2 * S2)
+
+    ## moments of the weights by integrating out the states one by one
+
+    def log_moment(n):
+
+        log_w = 0.
+        m, v  = mu[0], sigma[0]**2
+
+        for k in range(1, len(bridge)):
+
+            P = 1 / v + 2 * n * a[k-1]
+            if P <= 0:
+                return np.inf
+            y = (m / v - n * b[k-1]) / P
+            log_w += -n * c[k-1] - 0.5 * np.log(v * P) + 0.5 * (P * y**2 - m**2 / v)
+
+            m = tau[k] * y + (1-tau[k]) * mu[k]
+            v = tau[k]**2 / P + (1-tau[k]**2) * sigma[k]**2
+
+        return log_w
+
+    log_Z = log_moment(1)
+    rel_var = np.exp(log_moment(2) - 2 * log_Z) - 1
 
-        return self.schedule(y)
+    return dict(q_mu=q_mu, q_sigma=np.sqrt(q_var), mean=mean, var=var, log_Z=log_Z,
+                dissipation=mean + log_Z, relative_variance=rel_var,
+                bias=-rel_var / (2 * n_paths))
 
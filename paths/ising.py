@@ -1,36 +1,211 @@
+import copy
 import numpy as np
 
-from .core import Model, Kernel
-from ._paths import ising_energy, ising_sample
+from .core import Model, Kernel, random_state, chain_seeds
+from ._paths import ising_energy, ising_energy_batch, ising_sample_batch, \
+     ising_sweep, ising_pack, ising_unpack, packed_energy, packed_sweep, \
+     ising_swendsen_wang, ising_wolff
 
 class IsingModel(Model):
 
-    def __init__(self, L, beta=1.):
+    modes = ('metropolis', 'checkerboard', 'swendsen-wang', 'wolff')
+
+    ## spins are stored as bytes
+    dtype = np.int8
+
+    def __init__(self, L, beta=1., mode='metropolis'):
 
         self.L = int(L)
         self.beta = float(beta)
+        self.mode = mode
         
+    @property
+    def mode(self):
+        """
+        Sampling mode: single site Metropolis updates at random
+        positions ('metropolis'), sweeps over the two sublattices of
+        a checkerboard decomposition ('checkerboard') or cluster
+        updates ('swendsen-wang', 'wolff')
+        """
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        if value not in self.modes:
+            raise ValueError('mode must be one of {0}'.format(self.modes))
+        if value == 'checkerboard' and self.L % 2:
+            raise ValueError('checkerboard updates require an even L')
+        self._mode = value
+
+    def n_sweeps(self, n):
+        """
+        Number of checkerboard sweeps corresponding to 'n' spin flips
+        """
+        return max(1, int(round(float(n) / self.L**2)))
+
+    def raw_energy(self, x):
+        """
+        Energy at unit inverse temperature, i.e. energy(x) equals
+        beta * raw_energy(x)
+        """
+        x = np.ascontiguousarray(x, dtype=self.dtype)
+        if np.ndim(x) == 2:
+            return ising_energy_batch(self.L, x)
+        return ising_energy(self.L, x)
+
     def energy(self, x):
-        return self.beta * ising_energy(self.L, x)
+        return self.beta * self.raw_energy(x)
 
-    def sample(self, x=None, n=1, beta=None):
+    def sample(self, x=None, n=1, beta=None, size=None, mode=None, rng=None, E=None):
+        """
+        Metropolis sampling with 'n' single spin flips starting from
+        'x', which is either a single lattice or an array of shape
+        (n_paths, L*L) holding one lattice per row. For beta=0, 'size'
+        random lattices are generated. In checkerboard mode, 'n' is
+        rounded to full sweeps over the lattice. In the cluster modes
+        'swendsen-wang' and 'wolff', 'n' is the number of cluster
+        updates (the Wolff sampler returns the number of flipped spins
+        per lattice in place of the accepted moves). 'rng' is a seed or a
+        numpy.random.RandomState from which the seeds of the chains
+        are drawn (see random_state).
 
+        If specified, 'E' is a float array holding the raw energies of
+        the lattices (one per lattice) which is updated in place with
+        the energy changes of all accepted moves.
+        """
         beta = self.beta if beta is None else float(beta)
+        mode = self.mode if mode is None else mode
+        rng  = random_state(rng)
+
+        if size is None and np.ndim(x) == 2:
+            size = len(x)
 
         if beta == 0.:
-            x = 2 * np.random.randint(0,2,self.L**2,dtype='i') - 1
-            return np.ascontiguousarray(x)
+            shape = self.L**2 if size is None else (int(size), self.L**2)
+            x = rng.randint(0,2,shape,dtype=self.dtype)
+            x*= 2
+            x-= 1
+            if E is not None:
+                E[...] = self.raw_energy(x)
+            return x
 
         else:
-            x = x.copy() if x is not None else self.sample(beta=0.)
-            ising_sample(float(beta), int(n), self.L, x)
+            x = np.array(x, dtype=self.dtype) if x is not None else \
+                self.sample(beta=0., size=size, rng=rng)
+            X = x.reshape(-1, self.L**2)
+            seeds = chain_seeds(rng, len(X))
+            if mode == 'checkerboard':
+                ising_sweep(float(beta), self.n_sweeps(n), self.L, X, seeds, E)
+            elif mode == 'swendsen-wang':
+                ising_swendsen_wang(float(beta), int(n), self.L, X, seeds, E)
+            elif mode == 'wolff':
+                ising_wolff(float(beta), int(n), self.L, X, seeds, E)
+            else:
+                ising_sample_batch(float(beta), int(n), self.L, X, seeds, E)
             return x
-        
+
+class PackedIsingModel(IsingModel):
+    """PackedIsingModel
+
+    Ising model whose lattices are stored as bits: every row is packed
+    into ceil(L/64) unsigned 64 bit integers, so a lattice is an array
+    of L*ceil(L/64) words and a batch of lattices has shape (n_paths,
+    L*ceil(L/64)). Lattices are updated with multi-spin coded
+    checkerboard sweeps.
+    """
+    modes = ('checkerboard',)
+    dtype = np.uint64
+
+    def __init__(self, L, beta=1.):
+
+        super(PackedIsingModel, self).__init__(L, beta, 'checkerboard')
+
+    @property
+    def words(self):
+        """
+        Number of 64 bit words per lattice row
+        """
+        return (self.L + 63) // 64
+
+    def pack(self, x):
+        """
+        Convert lattice(s) of +1/-1 spins into bit-packed lattice(s)
+        """
+        x = np.ascontiguousarray(x, dtype=np.int8)
+        p = np.empty(x.shape[:-1] + (self.L * self.words,), dtype=np.uint64)
+        ising_pack(self.L, x, p)
+        return p
+
+    def unpack(self, p):
+        """
+        Convert bit-packed lattice(s) into lattice(s) of +1/-1 spins
+        """
+        p = np.ascontiguousarray(p, dtype=np.uint64)
+        x = np.empty(p.shape[:-1] + (self.L**2,), dtype=np.int8)
+        ising_unpack(self.L, p, x)
+        return x
+
+    def raw_energy(self, x):
+        E = packed_energy(self.L, x)
+        return E if np.ndim(x) == 2 else E[0]
+
+    def sample(self, x=None, n=1, beta=None, size=None, mode=None, rng=None, E=None):
+
+        beta = self.beta if beta is None else float(beta)
+        rng  = random_state(rng)
+
+        if size is None and np.ndim(x) == 2:
+            size = len(x)
+
+        if beta == 0.:
+            shape = self.L * self.words
+            shape = shape if size is None else (int(size), shape)
+            x = rng.randint(0, 256, np.prod(shape) * 8, dtype=np.uint8)
+            x = x.view(np.uint64).reshape(shape)
+            x.reshape(-1, self.words)[:,-1] &= packed_mask(self.L)
+            if E is not None:
+                E[...] = self.raw_energy(x)
+            return x
+
+        else:
+            x = x.copy() if x is not None else self.sample(beta=0., size=size, rng=rng)
+            seeds = chain_seeds(rng, 1 if size is None else size)
+            packed_sweep(float(beta), self.n_sweeps(n), self.L, x, seeds, E)
+            return x
+
+def packed_mask(L):
+    """
+    Valid bits in the last word of a packed lattice row
+    """
+    return np.uint64(2**(L % 64) - 1 if L % 64 else 2**64 - 1)
+
 class IsingKernel(Kernel):
 
-    def __init__(self, L, beta, n=1):
+    def __init__(self, L, beta, n=1, mode='metropolis', packed=False):
+        """
+        Parameters
+        ----------
+        L : integer
+          lattice size
+
+        beta : float
+          inverse temperature
+
+        n : integer
+          number of spin flips per transition (number of cluster
+          updates in the cluster modes)
 
-        self._stationary = IsingModel(L, beta)
+        mode : 'metropolis', 'checkerboard', 'swendsen-wang' or 'wolff'
+          update scheme
+
+        packed : boolean
+          if True, lattices are stored as bits and updated with
+          multi-spin coded checkerboard sweeps (mode will be ignored)
+        """
+        if packed:
+            self._stationary = PackedIsingModel(L, beta)
+        else:
+            self._stationary = IsingModel(L, beta, mode)
         self.n_transitions = int(n)
 
     @property
@@ -45,5 +220,47 @@ class IsingKernel(Kernel):
     def beta(self, value):
         self.stationary.beta = float(value)
 
-    def __call__(self, x):
-        return self.stationary.sample(x, self.n_transitions, self.beta)
+    def __call__(self, x, rng=None, E=None):
+        """
+        Apply the kernel to lattice(s) 'x'. If the raw energies 'E' are
+        provided, they will be updated in place (see IsingModel.sample)
+        """
+        return self.stationary.sample(x, self.n_transitions, self.beta, rng=rng, E=E)
+
+    def power(self, n):
+        """
+        Kernel applying 'n' times as many updates per transition
+        """
+        kernel = copy.deepcopy(self)
+        kernel.n_transitions *= int(n)
+        return kernel
+
+class SwendsenWangKernel(IsingKernel):
+    """SwendsenWangKernel
+
+    Ising kernel performing 'n' Swendsen-Wang cluster updates per
+    transition
+    """
+    def __init__(self, L, beta, n=1):
+
+        super(SwendsenWangKernel, self).__init__(L, beta, n, 'swendsen-wang')
+
+class WolffKernel(IsingKernel):
+    """WolffKernel
+
+    Ising kernel performing 'n' single cluster (Wolff) updates per
+    transition
+    """
+    def __init__(self, L, beta, n=1):
+
+        super(WolffKernel, self).__init__(L, beta, n, 'wolff')
+
+def lattice_bridge(beta, start, end):
+    """
+    Bridge constructor for lattice kernels (see make_bridge): returns a
+    copy of 'end' whose inverse temperature interpolates linearly
+    between the temperatures of 'start' and 'end'
+    """
+    kernel = copy.deepcopy(end)
+    kernel.beta = (1 - beta) * start.beta + beta * end.beta
+    return kernel
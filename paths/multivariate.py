@@ -0,0 +1,236 @@
+"""
+Multivariate Gaussian toy model: ensembles and transition kernels
+with exact normalization constants in arbitrary dimension
+"""
+import numpy as np
+
+from scipy.linalg import solve_triangular, cho_solve
+
+from .core import Model, Kernel, random_state
+
+class MultivariateGaussian(Model):
+    """MultivariateGaussian
+
+    Multivariate Gaussian distribution. The Cholesky factor of the
+    covariance matrix is computed once and cached. States are arrays of
+    shape (d,) or (n, d).
+    """
+    @property
+    def d(self):
+        return len(self.mu)
+
+    @property
+    def cholesky(self):
+        """
+        Lower triangular Cholesky factor of the covariance matrix
+        """
+        if self._cholesky is None:
+            self._cholesky = np.linalg.cholesky(self.Sigma)
+        return self._cholesky
+
+    @property
+    def precision(self):
+        """
+        Inverse covariance matrix
+        """
+        if self._precision is None:
+            self._precision = cho_solve((self.cholesky, True), np.eye(self.d))
+        return self._precision
+
+    @property
+    def log_det(self):
+        """
+        Log determinant of the covariance matrix
+        """
+        return 2 * np.log(np.diag(self.cholesky)).sum()
+
+    @property
+    def log_Z(self):
+        return 0.5 * (self.d * np.log(2*np.pi) + self.log_det)
+
+    def __init__(self, mu, Sigma):
+
+        super(MultivariateGaussian, self).__init__()
+
+        self.mu    = np.array(mu, dtype='d')
+        self.Sigma = np.array(Sigma, dtype='d')
+
+        if self.Sigma.shape != (self.d, self.d):
+            raise ValueError('covariance matrix must be of shape ({0}, {0})'.format(self.d))
+
+        self._cholesky  = None
+        self._precision = None
+
+    def sample(self, x=None, n=None, rng=None):
+        """
+        Generate a sample (x will be ignored)
+        """
+        shape = (self.d,) if n is None else (int(n), self.d)
+        return np.dot(random_state(rng).standard_normal(shape), self.cholesky.T) + self.mu
+
+    def sample_paths(self, n_paths, rng=None):
+        """
+        Exact samples, one per path
+        """
+        return self.sample(n=int(n_paths), rng=rng)
+
+    def whiten(self, x):
+        """
+        Transform states such that they are distributed according to a
+        standard normal distribution
+        """
+        y = solve_triangular(self.cholesky, (x - self.mu).T, lower=True)
+        return y.T
+
+    def energy(self, x):
+        """
+        Potential energy of the harmonic oscillator
+        """
+        y = x - self.mu
+        return 0.5 * np.sum(np.dot(y, self.precision) * y, -1)
+
+    def __str__(self):
+        return 'MultivariateGaussian(d={0}, log_det={1:.2f})'.format(self.d, self.log_det)
+
+    def kl(self, other):
+        """
+        Relative entropy / Kullback-Leibler divergence
+        """
+        A = solve_triangular(other.cholesky, self.cholesky, lower=True)
+        b = other.whiten(self.mu)
+
+        return 0.5 * (np.sum(A**2) + np.dot(b, b) - self.d + other.log_det - self.log_det)
+
+class MultivariateGaussianKernel(Kernel):
+    """MultivariateGaussianKernel
+
+    Gaussian transition kernel with a multivariate Gaussian stationary
+    distribution: x -> tau * x + (1-tau) * mu + sqrt(1-tau**2) * noise
+    with noise drawn from the stationary distribution centered at zero
+    """
+    @property
+    def tau(self):
+        """
+        Relaxation time
+        """
+        return self._tau
+
+    def mu(self, y=0):
+        return self.tau * y + (1-self.tau) * self._mu
+
+    @property
+    def stationary(self):
+        return self._stationary
+
+    def __init__(self, tau, mu, Sigma):
+        """
+        Parameters
+        ----------
+        tau : float in [0., 1.]
+          parameter specifying the convergence of the transition kernel
+
+        mu, Sigma : arrays
+          mean and covariance matrix of the Gaussian stationary
+          distribution
+        """
+        self._tau = float(tau)
+        self._stationary = MultivariateGaussian(mu, Sigma)
+
+    @property
+    def _mu(self):
+        return self._stationary.mu
+
+    @property
+    def _Sigma(self):
+        return self._stationary.Sigma
+
+    def __str__(self):
+        return 'MultivariateGaussianKernel(tau={0:.3e}, d={1})'.format(
+            self.tau, self.stationary.d)
+
+    def __call__(self, x, rng=None):
+        noise = np.dot(random_state(rng).standard_normal(np.shape(x)), self.stationary.cholesky.T)
+        return np.sqrt(1 - self.tau**2) * noise + self.mu(x)
+
+    def compose(self, other):
+
+        tau1, mu1, S1 = self.tau, self._mu, self._Sigma
+        tau2, mu2, S2 = other.tau, other._mu, other._Sigma
+
+        tau = tau1 * tau2
+        mu  = ((1-tau1) * mu1 + tau1*(1-tau2)*mu2) / (1 - tau)
+        S   = ((1-tau1**2) * S1 + tau1**2 * (1-tau2**2) * S2) / (1-tau**2)
+
+        return MultivariateGaussianKernel(tau, mu, S)
+
+    def power(self, n):
+        T = MultivariateGaussianKernel.__new__(MultivariateGaussianKernel)
+        T._tau = self.tau**n
+        T._stationary = self._stationary
+        return T
+
+class MultivariateBridge(MultivariateGaussianKernel):
+    """MultivariateBridge
+
+    Kernel interpolating between an initial and a target kernel (see
+    paths.gaussian.Bridge)
+    """
+    def __init__(self, beta, initial_kernel, target_kernel):
+        """
+        Parameters
+        ----------
+        beta : float
+          inverse temperature
+
+        initial_kernel, target_kernel : MultivariateGaussianKernel
+          initial and target kernel
+        """
+        self.initial_kernel = initial_kernel
+        self.target_kernel  = target_kernel
+
+        self.beta = float(beta)
+
+        tau0 = initial_kernel.tau
+        tau1 = target_kernel.tau
+        tau  = (1-self.beta) * tau0 + self.beta * tau1
+
+        mu, Sigma, precision = self.interpolate(tau)
+
+        super(MultivariateBridge, self).__init__(tau, mu, Sigma)
+
+        self._stationary._precision = precision
+
+    def interpolate(self, tau):
+        """
+        Mean, covariance and precision matrix (None if not available)
+        of the stationary distribution
+        """
+        beta = self.beta
+
+        tau0, mu0, S0 = self.initial_kernel.tau, self.initial_kernel._mu, self.initial_kernel._Sigma
+        tau1, mu1, S1 = self.target_kernel.tau, self.target_kernel._mu, self.target_kernel._Sigma
+
+        mu = ((1-beta) * (1-tau0) * mu0 + beta * (1-tau1) * mu1) / (1-tau)
+        S  = ((1-beta) * (1-tau0**2) * S0 + beta * (1-tau1**2) * S1) / (1-tau**2)
+
+        return mu, S, None
+
+class MultivariateGeometricBridge(MultivariateBridge):
+    """MultivariateGeometricBridge
+
+    Kernel whose stationary distribution is the geometric average of
+    the initial and target distribution (see paths.gaussian.GeometricBridge)
+    """
+    def interpolate(self, tau):
+
+        beta = self.beta
+        p0, p1 = self.initial_kernel.stationary, self.target_kernel.stationary
+
+        P0, P1 = p0.precision, p1.precision
+
+        P  = (1-beta) * P0 + beta * P1
+        L  = np.linalg.cholesky(P)
+        S  = cho_solve((L, True), np.eye(p0.d))
+        mu = cho_solve((L, True), (1-beta) * np.dot(P0, p0.mu) + beta * np.dot(P1, p1.mu))
+
+        return mu, S, P
@@ -1,7 +1,9 @@
 import numpy as np
 
+from .core import random_state, chain_seeds
 from .ising import IsingModel, IsingKernel
-from ._paths import potts_energy, potts_sample
+from ._paths import potts_energy, potts_energy_batch, potts_sample_batch, \
+     potts_sweep, potts_swendsen_wang, potts_wolff
 
 class PottsHistogram(object):
 
@@ -21,33 +23,79 @@ class PottsHistogram(object):
         
 class PottsModel(IsingModel):
 
-    def __init__(self, L, Q, beta=1.):
+    ## colors are stored as unsigned bytes
+    dtype = np.uint8
 
-        super(PottsModel, self).__init__(L, beta)
+    def __init__(self, L, Q, beta=1., mode='metropolis'):
+
+        super(PottsModel, self).__init__(L, beta, mode)
 
         self.Q = int(Q)
 
-    def energy(self, x):
-        return self.beta * potts_energy(self.L, x)
+        if not 1 < self.Q <= 256:
+            raise ValueError('number of colors must be between 2 and 256')
+
+    def raw_energy(self, x):
+        x = np.ascontiguousarray(x, dtype=self.dtype)
+        if np.ndim(x) == 2:
+            return potts_energy_batch(self.L, x)
+        return potts_energy(self.L, x)
 
-    def sample(self, x=None, n=1, beta=None):
+    def sample(self, x=None, n=1, beta=None, size=None, mode=None, rng=None, E=None):
 
         beta = self.beta if beta is None else float(beta)
+        mode = self.mode if mode is None else mode
+        rng  = random_state(rng)
+
+        if size is None and np.ndim(x) == 2:
+            size = len(x)
 
         if beta == 0.:
-            x = np.random.randint(0,self.Q,self.L**2,dtype='i')
-            return np.ascontiguousarray(x)
+            shape = self.L**2 if size is None else (int(size), self.L**2)
+            x = rng.randint(0,self.Q,shape,dtype=self.dtype)
+            if E is not None:
+                E[...] = self.raw_energy(x)
+            return x
 
         else:
-            x = x.copy() if x is not None else self.sample(beta=0.)
-            m = potts_sample(float(beta), int(n), self.L, self.Q, x)
+            x = np.array(x, dtype=self.dtype) if x is not None else \
+                self.sample(beta=0., size=size, rng=rng)
+            X = x.reshape(-1, self.L**2)
+            seeds = chain_seeds(rng, len(X))
+            if mode == 'checkerboard':
+                potts_sweep(float(beta), self.n_sweeps(n), self.L, self.Q, X, seeds, E)
+            elif mode == 'swendsen-wang':
+                potts_swendsen_wang(float(beta), int(n), self.L, self.Q, X, seeds, E)
+            elif mode == 'wolff':
+                potts_wolff(float(beta), int(n), self.L, self.Q, X, seeds, E)
+            else:
+                potts_sample_batch(float(beta), int(n), self.L, self.Q, X, seeds, E)
             return x
         
 class PottsKernel(IsingKernel):
 
+    def __init__(self, L, Q, beta, n=1, mode='metropolis'):
+
+        super(PottsKernel, self).__init__(L, beta, n, mode)
+
+        self._stationary = PottsModel(L, Q, beta, mode)
+
+class PottsSwendsenWangKernel(PottsKernel):
+    """PottsSwendsenWangKernel
+
+    Potts kernel performing 'n' Swendsen-Wang cluster updates per
+    transition
+    """
     def __init__(self, L, Q, beta, n=1):
 
-        super(PottsKernel, self).__init__(L, beta, n)
+        super(PottsSwendsenWangKernel, self).__init__(L, Q, beta, n, 'swendsen-wang')
 
-        self._stationary = PottsModel(L, Q, beta)
+class PottsWolffKernel(PottsKernel):
+    """PottsWolffKernel
+
+    Potts kernel performing 'n' single cluster (Wolff) updates per
+    transition
+    """
+    def __init__(self, L, Q, beta, n=1):
 
+        super(PottsWolffKernel, self).__init__(L, Q, beta, n, 'wolff')
@@ -1,10 +1,17 @@
+import copy
 import numpy as np
 
-from .core import Model, Kernel
-from ._paths import rbm_energy, ising_sample
+from scipy.special import expit
+
+from .core import Model, Kernel, random_state
 
 class RBM(Model):
+    """RBM
 
+    Restricted Boltzmann machine with binary visible and hidden units.
+    A state is a uint8 array holding the m visible units followed by
+    the n hidden units; a batch of states has shape (n_paths, m+n).
+    """
     @property
     def m(self):
         """
@@ -19,6 +26,13 @@ class RBM(Model):
         """
         return len(self.b)
 
+    @property
+    def weights(self):
+        """
+        Coupling matrix of shape (m, n)
+        """
+        return self.W.reshape(self.m, self.n)
+    
     def __init__(self, a, b, W, beta=1.):
 
         self.a = np.ascontiguousarray(a.flatten())
@@ -26,9 +40,20 @@ class RBM(Model):
         self.W = np.ascontiguousarray(W.flatten())
 
         self.beta = float(beta)
+
+    def raw_energy(self, x):
+        """
+        Energy at unit inverse temperature of a single state or a
+        batch of shape (N, m+n), evaluated with a single matrix-matrix
+        product
+        """
+        X = np.reshape(x, (-1, self.m + self.n)).astype('d')
+        v, h = X[:,:self.m], X[:,self.m:]
+        E = - np.dot(v, self.a) - np.dot(h, self.b) - np.sum(np.dot(v, self.weights) * h, 1)
+        return E if np.ndim(x) == 2 else E[0]
         
     def energy(self, x):
-        return self.beta * rbm_energy(x, self.a, self.b, self.W)
+        return self.beta * self.raw_energy(x)
 
     def energy_py(self, x):
 
@@ -37,25 +62,142 @@ class RBM(Model):
         return -self.beta * (np.dot(self.a,v) + np.dot(self.b,h) +
                              np.dot(v, np.dot(self.W.reshape(self.m,self.n),h)))
 
-    def sample(self, x=None, n=1, beta=None):
+    def free_energy(self, v, beta=None):
+        """
+        Energy of the marginal distribution of the visible units, i.e.
+        minus the log of the Boltzmann factor summed over all hidden
+        states. 'v' is a single state or a batch of shape (N, m) or
+        (N, m+n) (hidden units will be ignored).
+        """
+        beta = self.beta if beta is None else float(beta)
+        V = np.reshape(v, (-1, np.shape(v)[-1]))[:,:self.m].astype('d')
+        F = - beta * np.dot(V, self.a) - \
+            np.sum(np.logaddexp(0., beta * (np.dot(V, self.weights) + self.b)), 1)
+        return F if np.ndim(v) == 2 else F[0]
 
+    def sample(self, x=None, n=1, beta=None, size=None, rng=None, E=None):
+        """
+        Block Gibbs sampling: starting from state(s) 'x', the hidden
+        units and then the visible units are updated 'n' times. All
+        chains in a batch are updated at once using matrix-matrix
+        products with the weights. For beta=0, 'size' random states
+        are generated. If specified, the raw energies 'E' are updated
+        in place.
+        """
         beta = self.beta if beta is None else float(beta)
+        rng  = random_state(rng)
+
+        if size is None and np.ndim(x) == 2:
+            size = len(x)
 
         if beta == 0.:
-            x = np.random.randint(0, 2, self.m+self.n, dtype='i')
-            return np.ascontiguousarray(x)
+            shape = self.m + self.n
+            shape = shape if size is None else (int(size), shape)
+            x = rng.randint(0, 2, shape, dtype=np.uint8)
 
         else:
-            x = x.copy() if x is not None else self.sample(beta=0.)
-            ising_sample(float(beta), int(n), self.L, x)
-            return x
-        
-class IsingKernel(Kernel):
+            x = np.array(x, dtype=np.uint8) if x is not None else \
+                self.sample(beta=0., size=size, rng=rng)
+            X = x.reshape(-1, self.m + self.n)
+            v = X[:,:self.m].astype('d')
+            h = X[:,self.m:]
+            for _ in range(int(n)):
+                h = self.sample_hidden(v, beta, rng)
+                v = self.sample_visible(h, beta, rng)
+            X[:,:self.m] = v
+            X[:,self.m:] = h
+
+        if E is not None:
+            E[...] = self.raw_energy(x)
+
+        return x
+
+    def sample_hidden(self, v, beta=None, rng=None):
+        """
+        Draw hidden units conditioned on visible units 'v' (one row
+        per chain)
+        """
+        beta = self.beta if beta is None else float(beta)
+        p = expit(beta * (np.dot(v, self.weights) + self.b))
+        return (random_state(rng).random_sample(p.shape) < p).astype('d')
+
+    def sample_visible(self, h, beta=None, rng=None):
+        """
+        Draw visible units conditioned on hidden units 'h' (one row
+        per chain)
+        """
+        beta = self.beta if beta is None else float(beta)
+        p = expit(beta * (np.dot(h, self.weights.T) + self.a))
+        return (random_state(rng).random_sample(p.shape) < p).astype('d')
+
+class MarginalRBM(Model):
+    """MarginalRBM
 
-    def __init__(self, L, beta, n=1):
+    Marginal distribution of the visible units of an RBM whose energy
+    is the free energy (see RBM.free_energy). Since the free energy is
+    not linear in the inverse temperature, work is computed from
+    energy differences which amounts to Rao-Blackwellizing the hidden
+    units.
+    """
+    def __init__(self, rbm, beta=None):
 
-        self._stationary = IsingModel(L, beta)
+        self.rbm  = rbm
+        self.beta = rbm.beta if beta is None else float(beta)
+
+    def energy(self, v):
+        return self.rbm.free_energy(v, self.beta)
+
+    def sample(self, x=None, n=1, beta=None, size=None, rng=None):
+        """
+        Block Gibbs sampling of visible units 'x' (hidden units are
+        drawn and discarded). For beta=0, 'size' random states are
+        generated.
+        """
+        beta = self.beta if beta is None else float(beta)
+        rng  = random_state(rng)
+
+        if size is None and np.ndim(x) == 2:
+            size = len(x)
+
+        if beta == 0. or x is None:
+            shape = self.rbm.m if size is None else (int(size), self.rbm.m)
+            x = rng.randint(0, 2, shape, dtype=np.uint8)
+            if beta == 0.:
+                return x
+
+        v = np.reshape(x, (-1, self.rbm.m)).astype('d')
+        for _ in range(int(n)):
+            v = self.rbm.sample_visible(self.rbm.sample_hidden(v, beta, rng), beta, rng)
+
+        return v.astype(np.uint8).reshape(np.shape(x))
+
+class RBMKernel(Kernel):
+
+    def __init__(self, rbm, beta, n=1, marginal=False):
+        """
+        Parameters
+        ----------
+        rbm : RBM
+          restricted Boltzmann machine whose parameters will be shared
+          by the kernel
+
+        beta : float
+          inverse temperature
+
+        n : integer
+          number of block Gibbs updates per transition
+
+        marginal : boolean
+          if True, the states are visible units only and their
+          energy is the free energy (see MarginalRBM)
+        """
+        if marginal:
+            self._stationary = MarginalRBM(rbm, beta)
+        else:
+            self._stationary = copy.copy(rbm)
+            self._stationary.beta = float(beta)
         self.n_transitions = int(n)
+        self.marginal = bool(marginal)
 
     @property
     def stationary(self):
@@ -69,5 +211,21 @@ class IsingKernel(Kernel):
     def beta(self, value):
         self.stationary.beta = float(value)
 
-    def __call__(self, x):
-        return self.stationary.sample(x, self.n_transitions, self.beta)
+    def __call__(self, x, rng=None, E=None):
+        """
+        Apply the kernel to state(s) 'x'. If the raw energies 'E' are
+        provided, they will be updated in place (see RBM.sample)
+        """
+        if self.marginal:
+            if E is not None:
+                raise ValueError('free energies are not tracked')
+            return self.stationary.sample(x, self.n_transitions, self.beta, rng=rng)
+        return self.stationary.sample(x, self.n_transitions, self.beta, rng=rng, E=E)
+
+    def power(self, n):
+        """
+        Kernel applying 'n' times as many updates per transition (the
+        parameters of the RBM are shared)
+        """
+        rbm = self.stationary.rbm if self.marginal else self.stationary
+        return RBMKernel(rbm, self.beta, self.n_transitions * int(n), self.marginal)
@@ -0,0 +1,61 @@
+"""
+Importance weights and resampling schemes
+"""
+import numpy as np
+
+from .core import random_state
+
+def ess(W):
+    """
+    Effective sample size of the importance weights exp(-W)
+    """
+    w = np.exp(W.min() - W)
+    return w.sum()**2 / np.dot(w, w)
+
+def conditional_ess(W, dW):
+    """
+    Relative conditional effective sample size of the work increments
+    'dW' for paths carrying the work 'W', i.e. the fraction of the
+    current effective sample size retained after reweighting
+    """
+    w = normalized_weights(W)
+    v = np.exp(dW.min() - dW)
+    return np.dot(w, v)**2 / np.dot(w, v**2)
+
+def normalized_weights(W):
+    """
+    Normalized importance weights exp(-W) / sum(exp(-W))
+    """
+    w = np.exp(W.min() - W)
+    return w / w.sum()
+
+def systematic_resampling(w, rng=None):
+    """
+    Systematic resampling: a single uniform random number is shifted
+    across the cumulative weights. Returns the indices of the selected
+    paths in O(n).
+    """
+    n = len(w)
+    u = random_state(rng).random_sample()
+    c = np.cumsum(w)
+    c[-1] = 1.
+    N = np.clip(np.ceil(n * c - u), 0, n).astype('i')
+    counts = np.diff(np.append(0, N))
+    return np.repeat(np.arange(n), counts)
+
+def residual_resampling(w, rng=None):
+    """
+    Residual resampling: every path is copied floor(n*w) times, the
+    remaining paths are drawn from the residual weights. Returns the
+    indices of the selected paths in O(n).
+    """
+    n = len(w)
+    counts = np.floor(n * w).astype('i')
+    R = n - counts.sum()
+    if R > 0:
+        r = n * w - counts
+        counts += random_state(rng).multinomial(R, r / r.sum())
+    return np.repeat(np.arange(n), counts)
+
+resampling_schemes = {'systematic': systematic_resampling,
+                      'residual': residual_resampling}
@@ -1,8 +1,99 @@
+import time
+import Queue
+import threading
 import numpy as np
+import multiprocessing
 
-from .gaussian import Bridge
+from multiprocessing.pool import ThreadPool
 
-def make_bridge(start, end, schedule, n=1, constructor=Bridge):
+from .core import random_state
+from .storage import TrajectoryStore, bridge_beta
+from .resampling import ess, normalized_weights, conditional_ess, resampling_schemes
+from .estimators import jarzynski, jarzynski_error, bar, bar_error
+from .gaussian import Bridge, CompiledBridge
+
+class Executor(object):
+    """Executor
+
+    Evaluates functions on a batch of paths. The default executor
+    processes all paths at once in the calling thread.
+    """
+    def map(self, f, x, rng=None, **arrays):
+        """
+        Evaluate 'f' on all paths stored along the first axis of 'x'.
+        If 'rng' is specified, it will be passed on to 'f'. Additional
+        per-path arrays are passed on as keyword arguments.
+        """
+        if rng is not None:
+            arrays['rng'] = rng
+        return f(x, **arrays)
+
+class ThreadExecutor(Executor):
+    """ThreadExecutor
+
+    Distributes chunks of paths over a pool of threads. The chunks are
+    views into the state array shared by all threads, so no data are
+    copied or pickled. Kernels and energies implemented in the C
+    extension release the GIL and therefore run in parallel.
+    """
+    def __init__(self, n_threads=None, n_chunks=None):
+        """
+        Parameters
+        ----------
+        n_threads : integer or None
+          number of threads (default: number of cores)
+
+        n_chunks : integer or None
+          number of chunks into which the paths are split (default:
+          number of threads). Results obtained with a seeded random
+          number generator only depend on the number of chunks.
+        """
+        self.n_threads = int(n_threads or multiprocessing.cpu_count())
+        self.n_chunks  = int(n_chunks or self.n_threads)
+        self._pool     = ThreadPool(self.n_threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def chunks(self, n_paths):
+        """
+        Slices of the paths that are processed by the threads
+        """
+        bounds = np.linspace(0, n_paths, min(self.n_chunks, n_paths) + 1).astype('i')
+        return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def map(self, f, x, rng=None, **arrays):
+
+        chunks = self.chunks(len(x))
+
+        if rng is None:
+            tasks = [(chunk, None) for chunk in chunks]
+        else:
+            tasks = zip(chunks, random_state(rng).randint(2**32, size=len(chunks)))
+
+        def apply(task):
+            chunk, seed = task
+            kw = {key: value[chunk] for key, value in arrays.items()}
+            if seed is not None:
+                kw['rng'] = int(seed)
+            return f(x[chunk], **kw)
+
+        results = self._pool.map(apply, tasks)
+
+        y = np.empty((len(x),) + np.shape(results[0])[1:], dtype=np.result_type(results[0]))
+        for chunk, result in zip(chunks, results):
+            y[chunk] = result
+
+        return y
+
+def make_bridge(start, end, schedule, n=1, constructor=Bridge, compiled=False, pilot=None):
     """
     Construct a 'bridge', i.e. a sequence of transition kernels
 
@@ -12,8 +103,9 @@ def make_bridge(start, end, schedule, n=1, constructor=Bridge):
       transition kernels whose stationary distributions are the
       initial and final ensemble
 
-    schedule : iterable
-      inverse temperature schedule
+    schedule : iterable or 'adaptive'
+      inverse temperature schedule; 'adaptive' determines the
+      schedule with a pilot simulation (see adaptive_schedule)
 
     n : integer > 0
       power to which the intermediate transition kernels will be
@@ -21,17 +113,151 @@ def make_bridge(start, end, schedule, n=1, constructor=Bridge):
 
     constructor :
       constructor for the bridge
+
+    compiled : boolean
+      return a CompiledBridge (Gaussian kernels only)
+
+    pilot : dict or None
+      keyword arguments of the pilot simulation for an adaptive
+      schedule, e.g. dict(n_paths=1000, target=0.95, rng=1)
     """
+    if isinstance(schedule, basestring) and schedule == 'adaptive':
+        kernel   = lambda beta: constructor(beta, start, end).power(n)
+        schedule = adaptive_schedule(kernel, **(pilot or {}))
+
     bridge = [constructor(beta, start, end) for beta in schedule]
+    if compiled:
+        bridge = CompiledBridge.from_kernels(bridge)
+        return bridge.power(n) if n > 1 else bridge
     if n > 1:
         bridge = [T.power(n) for T in bridge]
 
     return bridge
 
-def generate_paths(bridge, n_paths=1, store_paths=False):
+def adaptive_schedule(kernel, n_paths=100, target=0.9, criterion='cess', beta_min=0.,
+                      beta_max=1., tol=1e-6, max_stages=10000, executor=None, rng=None):
+    """
+    Determine an inverse temperature schedule with a pilot simulation.
+    Starting from 'beta_min', every next inverse temperature is the
+    largest one for which the work increments of the pilot paths meet
+    the target (found by bisection); the pilot paths are then moved
+    with the kernel at the new inverse temperature. The schedule can
+    be used to set up the bridge for the production run.
+
+    Parameters
+    ----------
+    kernel : callable
+      returns the transition kernel for a given inverse temperature,
+      e.g. lambda beta: IsingKernel(L, beta, n)
+
+    n_paths : integer
+      number of pilot paths
+
+    target : float
+      minimum relative conditional effective sample size ('cess', see
+      paths.resampling.conditional_ess) or maximum variance of the
+      work increments ('variance')
+
+    criterion : 'cess' or 'variance'
+      statistic of the work increments that is controlled
+
+    beta_min, beta_max : float
+      initial and final inverse temperature
+
+    tol : float
+      precision of the inverse temperatures
+
+    max_stages : integer
+      maximum length of the schedule; a ValueError is raised if
+      'beta_max' is not reached within 'max_stages' stages
+
+    Returns
+    -------
+    schedule : array
+    """
+    if criterion not in ('cess', 'variance'):
+        raise ValueError('unknown criterion {0}'.format(criterion))
+
+    executor = executor or Executor()
+    rng = random_state(rng)
+
+    T = kernel(beta_min)
+    p = T.stationary
+    x = p.sample_paths(n_paths, rng=rng)
+    W = np.zeros(len(x))
+    linear = hasattr(p, 'raw_energy')
+    E = executor.map(p.raw_energy if linear else p.energy, x).astype('d')
+
+    def increment(beta):
+        T = kernel(beta)
+        if linear:
+            ## 'beta' parameterizes the bridge, the energies scale with
+            ## the inverse temperature of the stationary distribution
+            return (T.stationary.beta - p.beta) * E, T
+        return executor.map(T.stationary.energy, x) - E, T
+
+    def accept(dW):
+        if criterion == 'cess':
+            return conditional_ess(W, dW) >= target
+        return np.var(dW) <= target
+
+    schedule = [float(beta_min)]
+
+    while schedule[-1] < beta_max and len(schedule) < max_stages:
+
+        lower, upper = schedule[-1], float(beta_max)
+        dW, T = increment(upper)
+
+        if not accept(dW):
+            while upper - lower > tol:
+                beta = 0.5 * (lower + upper)
+                if accept(increment(beta)[0]):
+                    lower = beta
+                else:
+                    upper = beta
+            upper = min(max(lower, schedule[-1] + tol), beta_max)
+            dW, T = increment(upper)
+
+        W += dW
+        schedule.append(upper)
+
+        if linear:
+            x[...] = executor.map(T, x, rng=rng, E=E)
+            p = T.stationary
+        else:
+            x[...] = executor.map(T, x, rng=rng)
+            E = executor.map(T.stationary.energy, x)
+
+    if schedule[-1] < beta_max:
+        msg = 'schedule reached beta={0:.3e} < beta_max={1:.3e} after {2} stages; ' + \
+              'increase max_stages or relax the target'
+        raise ValueError(msg.format(schedule[-1], beta_max, len(schedule)))
+
+    return np.array(schedule)
+
+def trajectory_buffer(bridge, x, store_paths=True):
+    """
+    Preallocated array holding the states of all stages, i.e. the
+    full paths, whose first stage is initialized with 'x'. If
+    'store_paths' is a file name, the paths are written to a memory
+    mapped file (see paths.storage.TrajectoryStore), otherwise they
+    are kept in memory. Returns None if 'store_paths' is False.
+    """
+    if store_paths is False or store_paths is None:
+        return None
+    if isinstance(store_paths, basestring):
+        return TrajectoryStore.create(store_paths, bridge, x).paths
+
+    X = np.empty((len(bridge),) + np.shape(x), dtype=np.result_type(x))
+    X[0] = x
+    return X
+
+def generate_paths(bridge, n_paths=1, store_paths=False, executor=None):
     """
     Run a nonequilibrium simulation by stepping through a sequence
-    of Markov perturbations
+    of Markov perturbations. The states are kept in a single buffer
+    that is updated in place, so memory does not grow with the length
+    of the bridge unless the full paths are requested.
     
     Parameters
     ----------
@@ -41,28 +267,522 @@ def generate_paths(bridge, n_paths=1, store_paths=False):
     n_paths : integer
       number of paths that will be simulated
 
-    store_paths : boolean
+    store_paths : boolean or string
       flag that specifies if the full paths will be return or only
-      the final states
+      the final states. If a file name is given, the paths will be
+      written to a memory mapped file (see trajectory_buffer)
+
+    executor : Executor or None
+      executor that applies the transition kernels to all paths
     """
-    X = [bridge[0].stationary.sample(n=int(n_paths))]
+    executor = executor or Executor()
 
-    for T in bridge[1:]:
-        x = T(X[-1])
-        X.append(x)
+    x = bridge[0].stationary.sample_paths(n_paths)
+    X = trajectory_buffer(bridge, x, store_paths)
+
+    for k in range(1, len(bridge)):
+        x[...] = executor.map(bridge[k], x)
+        if X is not None:
+            X[k] = x
         
-    return np.array(X)
+    return x if X is None else X
+
+def is_linear(bridge):
+    """
+    Check if the energies of all stationary distributions are of the
+    form beta * raw_energy(x) with a common raw energy
+    """
+    return all(hasattr(T.stationary, 'raw_energy') for T in bridge)
+
+def iterate_stages(bridge, stage, x, W, E=None, executor=None, rng=None):
+    """
+    Apply the kernels following 'stage' to the states 'x' (updated in
+    place) and yield the index and the work increment of every stage,
+    which is also added to 'W'. 'E' are the tracked raw energies of
+    linear bridges (see simulate_linear).
+    """
+    executor = executor or Executor()
+
+    p = [T.stationary for T in bridge]
+
+    for k in range(stage + 1, len(bridge)):
+        if E is not None:
+            dW = (p[k].beta - p[k-1].beta) * E
+            x[...] = executor.map(bridge[k], x, rng=rng, E=E)
+        else:
+            dW = executor.map(lambda y: p[k].energy(y) - p[k-1].energy(y), x)
+            x[...] = executor.map(bridge[k], x, rng=rng)
+        W += dW
+        yield k, dW
+
+def propagate(bridge, stage, x, W, E=None, X=None, executor=None, rng=None,
+              checkpoint=None, energies=None):
+    """
+    Continue a simulation whose states 'x' have been propagated up to
+    'stage' by applying the remaining kernels of the bridge. The work
+    'W', the raw energies 'E' (only for linear bridges, see
+    simulate_linear) and the paths 'X' (if stored) are updated in
+    place. If a 'checkpoint' is given, the state of the simulation is
+    saved periodically. If an array 'energies' of shape (n_stages,
+    n_paths) is given, the energies after every stage are stored (raw
+    energies for linear bridges).
+    """
+    executor = executor or Executor()
+
+    p = [T.stationary for T in bridge]
 
-def simulate(bridge, n_paths=1):
+    for k, dW in iterate_stages(bridge, stage, x, W, E, executor, rng):
+        if X is not None:
+            X[k] = x
+        if energies is not None:
+            energies[k] = E if E is not None else executor.map(p[k].energy, x)
+        if checkpoint is not None and checkpoint.due(k, len(bridge)):
+            checkpoint.save(k, x, W, E, X, rng)
+
+    return W, x if X is None else X
+
+def simulate_linear(bridge, n_paths=1, store_paths=False, executor=None, rng=None,
+                    checkpoint=None):
+    """
+    Work simulation for bridges whose energies are linear in the
+    inverse temperature (see is_linear). The raw energies are computed
+    once for the initial states and then tracked by the kernels, so
+    the work increment of stage k is (beta[k+1] - beta[k]) * E[k].
+    """
+    executor = executor or Executor()
+    rng = random_state(rng)
+
+    p = bridge[0].stationary
+    x = p.sample_paths(n_paths, rng=rng)
+    X = trajectory_buffer(bridge, x, store_paths)
+    E = executor.map(p.raw_energy, x).astype('d')
+    W = np.zeros(len(E))
+
+    return propagate(bridge, 0, x, W, E, X, executor, rng, checkpoint)
+
+def simulate(bridge, n_paths=1, store_paths=False, executor=None, rng=None,
+             pool=None, n_shards=None, checkpoint=None):
     """
     Generate multiple paths from the bridge and compute the work
     Returns log weights (work) and final states (weighted samples
-    from the target ensemble).
+    from the target ensemble), or the full paths if 'store_paths' is
+    True.
+
+    The simulation is streamed: a single state buffer is updated in
+    place and the work is accumulated stage by stage, so only
+    O(n_paths) memory is used unless the paths are stored.
+
+    Transition kernels and energies are evaluated by 'executor' (see
+    ThreadExecutor for running paths in parallel). 'rng' is a seed or
+    a numpy.random.RandomState (see random_state).
+
+    If a process 'pool' is given, the paths are split into 'n_shards'
+    shards that are simulated independently (see simulate_sharded).
+
+    If 'store_paths' is a file name, the paths are written to a memory
+    mapped file rather than held in memory (see trajectory_buffer).
+
+    If a 'checkpoint' (paths.storage.Checkpoint) is given, the state of
+    the simulation is saved periodically so that an interrupted run
+    can be continued with 'resume'.
     """
-    X = generate_paths(bridge, n_paths)
-    p = [T.stationary for T in bridge]
-    W = np.sum([p[k+1].energy(X[k]) - p[k].energy(X[k])
-                for k in range(len(bridge)-1)],0)
+    if isinstance(bridge, CompiledBridge) and pool is None and checkpoint is None:
+        return simulate_compiled(bridge, n_paths, store_paths, rng)
+
+    if pool is not None:
+        if checkpoint is not None:
+            raise ValueError('checkpoints are not supported for sharded simulations')
+        return simulate_sharded(bridge, n_paths, pool, n_shards, store_paths, rng)
+
+    if is_linear(bridge):
+        return simulate_linear(bridge, n_paths, store_paths, executor, rng, checkpoint)
+
+    executor = executor or Executor()
+    rng = random_state(rng)
+
+    x = bridge[0].stationary.sample_paths(n_paths, rng=rng)
+    X = trajectory_buffer(bridge, x, store_paths)
+    W = np.zeros(len(x))
+
+    return propagate(bridge, 0, x, W, None, X, executor, rng, checkpoint)
+
+def simulate_compiled(bridge, n_paths=1, store_paths=False, rng=None):
+    """
+    Work simulation along a compiled Gaussian bridge. States, work and
+    a scratch buffer are preallocated and updated in place, so every
+    stage costs a few vectorized passes over the paths. The random
+    numbers are drawn in the same order as in simulate.
+    """
+    rng = random_state(rng)
+
+    tau, mu, sigma = bridge.tau, bridge.mu, bridge.sigma
+    scale = np.sqrt(1 - tau**2) * sigma
+
+    x = rng.standard_normal(int(n_paths))
+    x*= sigma[0]
+    x+= mu[0]
+
+    X = trajectory_buffer(bridge, x, store_paths)
+    W = np.zeros(len(x))
+    y = np.empty(len(x))
+
+    for k in range(1, len(bridge)):
+
+        ## work increment: energy difference of the current states
+        np.subtract(x, mu[k], y)
+        y *= y
+        y *= 0.5 / sigma[k]**2
+        W += y
+        np.subtract(x, mu[k-1], y)
+        y *= y
+        y *= 0.5 / sigma[k-1]**2
+        W -= y
+
+        ## Gaussian transition
+        y[...] = rng.standard_normal(len(x))
+        y *= scale[k]
+        x *= tau[k]
+        x += (1 - tau[k]) * mu[k]
+        x += y
+
+        if X is not None:
+            X[k] = x
+
+    return W, x if X is None else X
+
+def resume(bridge, checkpoint, executor=None):
+    """
+    Resume a simulation from the last state saved in 'checkpoint'
+    (see simulate) and return the work and final states (or paths)
+    """
+    state = checkpoint.load()
+
+    return propagate(bridge, state['stage'], state['x'], state['W'], state['E'],
+                     state['X'], executor, state['rng'], checkpoint)
+
+def simulate_shard(task):
+    """
+    Simulate a single shard in a worker process
+    """
+    bridge, n_paths, store_paths, seed = task
+    return simulate(bridge, n_paths, store_paths, rng=seed)
+
+def simulate_sharded(bridge, n_paths, pool, n_shards=None, store_paths=False, rng=None):
+    """
+    Split the paths into shards that are simulated in parallel by a
+    process pool, e.g. a multiprocessing.Pool or a
+    concurrent.futures.ProcessPoolExecutor (anything with a 'map'
+    method). Every shard is seeded with its own random number stream
+    drawn from 'rng', and work and final states (or paths) are merged
+    in the order of the shards. Therefore, results obtained with a
+    seeded 'rng' only depend on the number of shards, but not on the
+    number of workers.
+
+    Parameters
+    ----------
+    bridge : iterable
+      sequence of transition kernels (must be picklable)
+
+    n_paths : integer
+      total number of paths
+
+    pool : process pool
+      pool whose 'map' distributes the shards over the workers
+
+    n_shards : integer or None
+      number of shards (default: 16)
+
+    store_paths : boolean or string
+      return full paths rather than final states. The shards keep
+      their paths in memory; if a file name is given, the merged
+      paths are written to a memory mapped file
+
+    rng : seed, numpy.random.RandomState or None
+      generator from which the seeds of the shards are drawn
+    """
+    n_paths  = int(n_paths)
+    n_shards = min(int(n_shards or 16), n_paths)
+    bounds   = np.linspace(0, n_paths, n_shards + 1).astype('i')
+    seeds    = random_state(rng).randint(2**32, size=n_shards)
+    tasks    = [(bridge, b - a, bool(store_paths), int(seed))
+                for a, b, seed in zip(bounds[:-1], bounds[1:], seeds)]
+
+    results = list(pool.map(simulate_shard, tasks))
+
+    W = np.concatenate([result[0] for result in results])
+    x = np.concatenate([result[1] for result in results], axis=int(bool(store_paths)))
+
+    if isinstance(store_paths, basestring):
+        X = trajectory_buffer(bridge, x[0], store_paths)
+        X[1:] = x[1:]
+        x = X
+
+    return W, x
+
+def simulate_bidirectional(bridge, n_paths=1, store_energies=False, resampling='systematic',
+                           executor=None, rng=None):
+    """
+    Forward and reverse simulation. The reverse simulation along the
+    reversed bridge starts from final states of the forward simulation
+    that are resampled according to their importance weights in O(n)
+    (see paths.resampling).
+
+    Parameters
+    ----------
+    bridge : iterable
+      sequence of transition kernels
+
+    n_paths : integer
+      number of paths simulated in each direction
+
+    store_energies : boolean
+      if True, the energies of all stages are returned as arrays of
+      shape (n_stages, n_paths), which hold raw energies for linear
+      bridges (see is_linear)
+
+    resampling : 'systematic' or 'residual'
+      scheme used to select the initial states of the reverse paths
+
+    executor : Executor or None
+      executor that applies the transition kernels to all paths
+
+    rng : seed, numpy.random.RandomState or None
+      random number generator (see random_state)
+
+    Returns
+    -------
+    Forward work, reverse work and, if requested, the energies of the
+    forward and reverse simulation
+    """
+    executor = executor or Executor()
+    rng      = random_state(rng)
+    linear   = is_linear(bridge)
+    reverse  = bridge[::-1]
+
+    def energy(p, x):
+        return executor.map(p.raw_energy if linear else p.energy, x).astype('d')
+
+    ## forward simulation
+
+    x   = bridge[0].stationary.sample_paths(n_paths, rng=rng)
+    E   = energy(bridge[0].stationary, x)
+    E_f = np.empty((len(bridge), len(x))) if store_energies else None
+    W_f = np.zeros(len(x))
+
+    if store_energies:
+        E_f[0] = E
+
+    propagate(bridge, 0, x, W_f, E if linear else None, None, executor, rng,
+              energies=E_f)
+
+    ## initial states of reverse simulation
+
+    i = resampling_schemes[resampling](normalized_weights(W_f), rng)
+    x = x[i]
+    E = E[i] if linear else energy(reverse[0].stationary, x)
+
+    ## reverse simulation
+
+    E_r = np.empty((len(bridge), len(x))) if store_energies else None
+    W_r = np.zeros(len(x))
+
+    if store_energies:
+        E_r[0] = E
+
+    propagate(reverse, 0, x, W_r, E if linear else None, None, executor, rng,
+              energies=E_r)
+
+    if store_energies:
+        return W_f, W_r, E_f, E_r
+    else:
+        return W_f, W_r
+
+def simulate_until(bridge, tol=0.1, batch_size=100, max_paths=None, max_time=None,
+                   estimator='jarzynski', min_ess=0.1, executor=None, rng=None,
+                   verbose=False):
+    """
+    Simulate batches of paths until the standard error of the log
+    evidence estimate drops below 'tol' or the budget is exhausted.
+
+    The standard errors are asymptotic (delta method) and are computed
+    from the same weights as the estimate. If the weights degenerate,
+    i.e. a few paths dominate, the error is grossly underestimated
+    although the estimate is biased. Therefore, the simulation only
+    stops on 'tol' once the relative effective sample size of the
+    weights is at least 'min_ess'.
+
+    Parameters
+    ----------
+    bridge : iterable
+      sequence of transition kernels
+
+    tol : float
+      tolerance on the standard error of log Z
+
+    batch_size : integer
+      number of paths simulated per batch (in each direction)
+
+    max_paths : integer or None
+      maximum number of paths (per direction)
+
+    max_time : float or None
+      maximum wall clock time in seconds
+
+    estimator : 'jarzynski' or 'bar'
+      evidence estimator; BAR uses forward and reverse simulations
+      (see simulate_bidirectional)
+
+    min_ess : float
+      minimum relative effective sample size (see paths.resampling.ess)
+      of the forward weights (Jarzynski) or of the better of the
+      forward and reverse weights (BAR)
+
+    executor, rng :
+      see simulate
+
+    verbose : boolean
+      report the estimate after every batch
+
+    Returns
+    -------
+    Estimated log Z, its standard error, forward work and reverse work
+    (None for the Jarzynski estimator)
+    """
+    if estimator not in ('jarzynski', 'bar'):
+        raise ValueError('unknown estimator: {0}'.format(estimator))
+
+    rng = random_state(rng)
+    t0  = time.time()
+    W_f = np.zeros(0)
+    W_r = np.zeros(0) if estimator == 'bar' else None
+    n_r = 0.
+
+    while True:
+
+        if estimator == 'bar':
+            w_f, w_r = simulate_bidirectional(bridge, batch_size, executor=executor, rng=rng)
+            W_f = np.append(W_f, w_f)
+            W_r = np.append(W_r, w_r)
+            ## reverse paths start from resampled forward states, count
+            ## the expected number of distinct initial states
+            n_r+= np.minimum(1., len(w_f) * normalized_weights(w_f)).sum()
+            dF  = bar(W_f, -W_r)
+            log_Z, error = -dF, bar_error(W_f, -W_r, dF, n_r=n_r)
+            n_eff = max(ess(W_f), ess(-W_r)) / len(W_f)
+        else:
+            W_f = np.append(W_f, simulate(bridge, batch_size, executor=executor, rng=rng)[0])
+            log_Z, error = -jarzynski(W_f), jarzynski_error(W_f)
+            n_eff = ess(W_f) / len(W_f)
+
+        if verbose:
+            print '{0} paths: log(Z)={1:.3f} +/- {2:.3f}, ESS={3:.3f}'.format(
+                len(W_f), log_Z, error, n_eff)
+
+        if error < tol and n_eff >= min_ess:
+            break
+        if max_paths is not None and len(W_f) + batch_size > max_paths:
+            break
+        if max_time is not None and time.time() - t0 > max_time:
+            break
+
+    return log_Z, error, W_f, W_r
+
+def simulate_iter(bridge, n_paths=1, executor=None, rng=None):
+    """
+    Iterator version of simulate that yields
+
+      (stage index, beta, work increment, running work)
+
+    after every kernel application. Only the current states are kept in
+    memory. The running work is a single array that is updated in
+    place, so it should be copied if it is stored. Closing the iterator
+    (or breaking out of a loop over it) aborts the simulation.
+    """
+    executor = executor or Executor()
+    rng      = random_state(rng)
+
+    p = bridge[0].stationary
+    x = p.sample_paths(n_paths, rng=rng)
+    E = executor.map(p.raw_energy, x).astype('d') if is_linear(bridge) else None
+    W = np.zeros(len(x))
+
+    for k, dW in iterate_stages(bridge, 0, x, W, E, executor, rng):
+        yield k, bridge_beta(bridge[k]), dW, W
+
+class BackgroundSimulation(object):
+    """BackgroundSimulation
+
+    Runs simulate_iter in a background thread and hands the stages to
+    the consumer through a queue, so that progress can be monitored
+    without blocking the consumer. An event loop based job runner can
+    await the stages by running 'get' in its thread pool executor (e.g.
+    loop.run_in_executor(None, sim.get)). Iterating over the simulation
+    blocks until the next stage is available. Items are (stage index,
+    beta, work increment, running work) where the running work is a
+    copy.
+    """
+    def __init__(self, bridge, n_paths=1, executor=None, rng=None, maxsize=1):
+        """
+        Parameters
+        ----------
+        bridge, n_paths, executor, rng :
+          see simulate_iter
+
+        maxsize : integer
+          maximum number of stages waiting in the queue; the
+          simulation pauses while the queue is full
+        """
+        self._queue  = Queue.Queue(maxsize)
+        self._abort  = threading.Event()
+        self._done   = False
+        self._thread = threading.Thread(target=self._run,
+                                        args=(bridge, n_paths, executor, rng))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._abort.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _run(self, bridge, n_paths, executor, rng):
+        try:
+            for k, beta, dW, W in simulate_iter(bridge, n_paths, executor, rng):
+                if not self._put((k, beta, dW, W.copy())):
+                    break
+        except Exception as error:
+            self._put(error)
+        self._put(StopIteration())
+
+    def get(self, timeout=None):
+        """
+        Next stage; raises StopIteration when the simulation is
+        finished (also on every later call) and re-raises errors of the
+        simulation
+        """
+        if self._done:
+            raise StopIteration
+        item = self._queue.get(timeout=timeout)
+        if isinstance(item, StopIteration):
+            self._done = True
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def __iter__(self):
+        return self
 
-    return W, X[-1]
+    def next(self):
+        return self.get()
 
+    def cancel(self):
+        """
+        Abort the simulation after the current stage
+        """
+        self._abort.set()
+        self._thread.join()
+        self._done = True
@@ -0,0 +1,92 @@
+"""
+Sequential Monte Carlo: annealed importance sampling with resampling
+"""
+import numpy as np
+
+from csb.numeric import log_sum_exp
+
+from .core import random_state
+from .simulate import Executor, is_linear
+from .resampling import ess, normalized_weights, resampling_schemes
+
+def smc(bridge, n_paths=1, threshold=0.5, resampling='systematic', executor=None, rng=None):
+    """
+    Sequential Monte Carlo along a bridge. Paths are reweighted and
+    moved as in annealed importance sampling (see simulate), but are
+    resampled whenever the effective sample size drops below
+    'threshold' * n_paths.
+
+    Parameters
+    ----------
+    bridge : iterable
+      sequence of transition kernels (see make_bridge)
+
+    n_paths : integer
+      number of paths (particles)
+
+    threshold : float
+      relative effective sample size that triggers resampling
+
+    resampling : 'systematic' or 'residual'
+      resampling scheme
+
+    executor : Executor or None
+      executor that applies the transition kernels to all paths
+
+    rng : seed, numpy.random.RandomState or None
+      random number generator (see random_state)
+
+    Returns
+    -------
+    log_Z : float
+      estimated log ratio of the normalization constants of the final
+      and initial ensemble (the estimate of Z is unbiased)
+
+    W : array
+      work accumulated since the last resampling step, i.e. minus the
+      log weights of the final states
+
+    x : array
+      final states
+
+    ess : array
+      effective sample size after reweighting at every stage
+    """
+    executor = executor or Executor()
+    rng      = random_state(rng)
+    resample = resampling_schemes[resampling]
+
+    p = [T.stationary for T in bridge]
+    x = p[0].sample_paths(n_paths, rng=rng)
+    n = len(x)
+    W = np.zeros(n)
+    E = executor.map(p[0].raw_energy, x).astype('d') if is_linear(bridge) else None
+
+    log_Z = 0.
+    n_eff = [float(n)]
+
+    for k in range(1, len(bridge)):
+
+        if E is not None:
+            W += (p[k].beta - p[k-1].beta) * E
+        else:
+            W += executor.map(lambda y: p[k].energy(y) - p[k-1].energy(y), x)
+
+        n_eff.append(ess(W))
+
+        if n_eff[-1] < threshold * n:
+            log_Z += log_sum_exp(-W) - np.log(n)
+            i = resample(normalized_weights(W), rng)
+            x = x[i]
+            if E is not None:
+                E = E[i]
+            W[...] = 0.
+
+        if E is not None:
+            x[...] = executor.map(bridge[k], x, rng=rng, E=E)
+        else:
+            x[...] = executor.map(bridge[k], x, rng=rng)
+
+    log_Z += log_sum_exp(-W) - np.log(n)
+
+    return log_Z, W, x, np.array(n_eff)
@@ -0,0 +1,183 @@
+"""
+On-disk storage of nonequilibrium simulations
+"""
+import os
+import json
+import struct
+import numpy as np
+
+class Checkpoint(object):
+    """Checkpoint
+
+    Periodically saves the state of a running simulation (current
+    stage, states, accumulated work, tracked raw energies, stored paths
+    and the state of the random number generator) to a npz file, from
+    which the simulation can be resumed (see paths.simulate.resume).
+    """
+    def __init__(self, filename, every=1):
+        """
+        Parameters
+        ----------
+        filename : string
+          path of the npz file
+
+        every : integer
+          number of stages between two checkpoints (the final stage
+          is always saved)
+        """
+        self.filename = filename
+        self.every    = int(every)
+
+    @property
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def due(self, stage, n_stages):
+        """
+        Check if a checkpoint should be written after 'stage'
+        """
+        return stage % self.every == 0 or stage == n_stages - 1
+
+    def save(self, stage, x, W, E=None, X=None, rng=None):
+        """
+        Write the simulation state. The file is replaced atomically, so
+        an interruption while saving leaves the previous checkpoint
+        intact.
+        """
+        data = dict(stage=int(stage), x=x, W=W)
+        if E is not None:
+            data['E'] = E
+        if isinstance(X, np.memmap):
+            ## paths are already on disk
+            X.flush()
+            data['X_file'] = X.filename
+        elif X is not None:
+            data['X'] = X
+        if rng is not None:
+            name, keys, pos, has_gauss, gauss = rng.get_state()
+            data.update(rng_keys=keys, rng_pos=pos, rng_has_gauss=has_gauss,
+                        rng_gauss=gauss)
+
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **data)
+        os.rename(tmp, self.filename)
+
+    def load(self):
+        """
+        Read the simulation state. Returns a dictionary with keys
+        'stage', 'x', 'W', 'E', 'X' and 'rng' (missing entries are None,
+        'rng' is a numpy.random.RandomState)
+        """
+        with np.load(self.filename) as f:
+            data = {key: f[key] for key in f.files}
+
+        state = dict(stage=int(data['stage']), x=data['x'], W=data['W'],
+                     E=data.get('E'), X=data.get('X'), rng=None)
+
+        if 'X_file' in data:
+            state['X'] = TrajectoryStore(str(data['X_file']), 'r+').paths
+
+        if 'rng_keys' in data:
+            rng = np.random.RandomState()
+            rng.set_state(('MT19937', data['rng_keys'], int(data['rng_pos']),
+                           int(data['rng_has_gauss']), float(data['rng_gauss'])))
+            state['rng'] = rng
+
+        return state
+
+class TrajectoryStore(object):
+    """TrajectoryStore
+
+    Full paths of a simulation stored in a binary file that is mapped
+    into memory. The file starts with a small header describing the
+    bridge (names of the kernels, inverse temperatures), the data type
+    and the shape (n_stages, n_paths, ...) of the paths, followed by
+    the raw states in C order. States of a single stage or of a single
+    path can be sliced without copying.
+    """
+    magic = 'PATHS\x01'
+
+    ## data start at a multiple of 64 bytes
+    align = 64
+
+    def __init__(self, filename, mode='r'):
+        """
+        Open an existing trajectory file ('mode' as in numpy.memmap)
+        """
+        self.filename = filename
+        self.header   = self.read_header(filename)
+        self.paths    = np.memmap(filename, dtype=np.dtype(self.header['dtype']),
+                                  mode=mode, offset=self.header['offset'],
+                                  shape=tuple(self.header['shape']))
+
+    @classmethod
+    def read_header(cls, filename):
+
+        with open(filename, 'rb') as f:
+            if f.read(len(cls.magic)) != cls.magic:
+                raise IOError('{0} is not a trajectory file'.format(filename))
+            size = struct.unpack('<I', f.read(4))[0]
+            return json.loads(f.read(size))
+
+    @classmethod
+    def create(cls, filename, bridge, x):
+        """
+        Create a trajectory file for the paths generated by 'bridge'
+        starting from states 'x', which are stored as the first stage
+        """
+        x = np.asarray(x)
+        header = dict(dtype=x.dtype.str,
+                      shape=(len(bridge),) + x.shape,
+                      kernels=[T.__class__.__name__ for T in bridge],
+                      beta=[bridge_beta(T) for T in bridge])
+
+        ## offset is part of the header, so its size is fixed first
+        header['offset'] = 0
+        size = len(json.dumps(header)) + 16
+        header['offset'] = -(-(len(cls.magic) + 4 + size) // cls.align) * cls.align
+        text = json.dumps(header).ljust(header['offset'] - len(cls.magic) - 4)
+
+        with open(filename, 'wb') as f:
+            f.write(cls.magic)
+            f.write(struct.pack('<I', len(text)))
+            f.write(text)
+            ## allocate the data section
+            f.seek(header['offset'] + len(bridge) * x.nbytes - 1)
+            f.write('\0')
+
+        store = cls(filename, 'r+')
+        store.paths[0] = x
+
+        return store
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        return self.paths[index]
+
+    def __setitem__(self, index, value):
+        self.paths[index] = value
+
+    def stage(self, k):
+        """
+        States of all paths at stage 'k'
+        """
+        return self.paths[k]
+
+    def path(self, i):
+        """
+        States of path 'i' at all stages
+        """
+        return self.paths[:,i]
+
+    def flush(self):
+        self.paths.flush()
+
+def bridge_beta(kernel):
+    """
+    Inverse temperature of a kernel (None if undefined)
+    """
+    beta = getattr(kernel, 'beta', None)
+    return None if beta is None else float(beta)
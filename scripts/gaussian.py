@@ -28,18 +28,9 @@ schedule  = scheduler.find_schedule(10)
 
 ## setup sequence of transition kernels and compute intermediate distributions
 
-bridge    = pth.make_bridge(start, end, schedule, 5, pth.GeometricBridge)
-p         = [T.stationary for T in bridge]
-q         = [p[0]]
-
-for T in bridge[1:]:
-
-    mu, sigma, tau = T._mu, T._sigma, T.tau
-
-    mu  = (1-tau) * mu + tau * q[-1].mu
-    var = (1-tau**2) * sigma**2 + tau**2 * q[-1].sigma**2
-
-    q.append(pth.Gaussian(mu,var**0.5))
+bridge    = pth.make_bridge(start, end, schedule, 5, pth.GeometricBridge, compiled=True)
+p         = bridge.stationary
+stats     = pth.work_statistics(bridge)
 
 ## run forward / backward work simulations
     
@@ -51,10 +42,12 @@ W_r    = -pth.simulate(bridge[::-1], n_paths)[0]
 p_mu   = np.array([pp.mu for pp in p])
 p_std  = np.array([pp.sigma for pp in p])
 
-q_mu   = np.array([pp.mu for pp in q])
-q_std  = np.array([pp.sigma for pp in q])
+q_mu   = stats['q_mu']
+q_std  = stats['q_sigma']
 
 print log_Z, -jarzynski(W_f), jarzynski(-W_r), -bar(W_f, W_r)
+print 'work: exact mean={0:.2f}, var={1:.2f}, simulated mean={2:.2f}, var={3:.2f}'.format(
+    stats['mean'], stats['var'], W_f.mean(), W_f.var())
 
 ## plot results
 
@@ -9,8 +9,6 @@ import matplotlib.pylab as plt
 
 from paths.estimators import jarzynski, cumulant, bar, histogram
 
-from csb.numeric import log_sum_exp
-
 sns.set(style='ticks', palette='Set2', context='notebook', font_scale=1.75)
 
 L        = (16, 32)[0]  ## size of Ising model: L**2 spins
@@ -19,42 +17,14 @@ n_beta   = 20           ## length of inverse temperature schedule
 n_relax  = 1e3          ## number of spin flips used in transition kernel
 
 entropy  = pth.IsingEntropy(L)
-beta     = np.linspace(0., 1., n_beta)
+beta     = pth.ThermodynamicScheduler(entropy, 0., 1.).find_schedule(n_beta-1)
 bridge   = [pth.IsingKernel(L, b, n_relax) for b in beta]
-energy   = pth.IsingModel(L,beta=1.).energy
 E_mean   = np.array(map(entropy.E_mean, beta))
 
-## forward sampling, forward work
-
-X_f = [bridge[0].stationary.sample() for _ in xrange(n_paths)]
-E_f = [map(energy, X_f)]
-
-for T in bridge[1:]:
-    X_f  = map(T, X_f)
-    E_f += [map(energy, X_f)]
-    
-E_f = np.array(E_f)
-W_f = np.dot(beta[1:]-beta[:-1], E_f[:-1])
-
-## compute importance weights of final states
-
-p = np.exp(-W_f-log_sum_exp(-W_f))
-p/= p.sum()
-
-## select initial states from reverse simulation according to
-## importance weights of final states from forward simulation
-
-X_r = [X_f[i] for i in np.random.multinomial(1,p,size=n_paths).argmax(1)]
-E_r = [map(energy, X_r)]
-
-## backward simulation using reverse bridge (detailed balance!)
+## forward simulation, resampling of final states according to their
+## importance weights and reverse simulation (detailed balance!)
 
-for T in bridge[::-1][1:]:
-    X_r  = map(T, X_r)
-    E_r += [map(energy, X_r)]
-    
-E_r = np.array(E_r)
-W_r = np.dot(beta[::-1][1:]-beta[::-1][:-1], E_r[:-1])
+W_f, W_r, E_f, E_r = pth.simulate_bidirectional(bridge, n_paths, store_energies=True)
 
 ## report estimated evidence and compare to exact value
 
@@ -10,8 +10,6 @@ import matplotlib.pylab as plt
 from paths.potts import PottsHistogram
 from paths.estimators import jarzynski, cumulant, bar, histogram
 
-from csb.numeric import log_sum_exp
-
 sns.set(style='ticks', palette='Set2', context='notebook', font_scale=1.75)
 
 Q        = 10           ## number of colors
@@ -21,43 +19,15 @@ n_beta   = 100          ## length of inverse temperature schedule
 n_relax  = 1e4          ## number of color flips used in transition kernel
 
 entropy  = pth.PottsEntropy(L)
-beta     = np.linspace(0., 2., n_beta)
+beta     = pth.ThermodynamicScheduler(entropy, 0., 2.).find_schedule(n_beta-1)
 hist     = PottsHistogram(L)
 bridge   = [pth.PottsKernel(L, Q, b, n_relax) for b in beta]
-energy   = pth.PottsModel(L, Q, beta=1).energy
 E_mean   = np.array(map(entropy.E_mean, beta))
 
-## forward sampling, forward work
-
-X_f = [bridge[0].stationary.sample() for _ in xrange(n_paths)]
-E_f = [map(energy, X_f)]
-
-for T in bridge[1:]:
-    X_f  = map(T, X_f)
-    E_f += [map(energy, X_f)]
-    
-E_f = np.array(E_f)
-W_f = np.dot(beta[1:]-beta[:-1], E_f[:-1])
-
-## compute importance weights of final states
-
-p = np.exp(-W_f-log_sum_exp(-W_f))
-p/= p.sum()
-
-## select initial states from reverse simulation according to
-## importance weights of final states from forward simulation
-
-X_r = [X_f[i] for i in np.random.multinomial(1,p,size=n_paths).argmax(1)]
-E_r = [map(energy, X_r)]
-
-## backward simulation using reverse bridge (detailed balance!)
+## forward simulation, resampling of final states according to their
+## importance weights and reverse simulation (detailed balance!)
 
-for T in bridge[::-1][1:]:
-    X_r  = map(T, X_r)
-    E_r += [map(energy, X_r)]
-    
-E_r = np.array(E_r)
-W_r = np.dot(beta[::-1][1:]-beta[::-1][:-1], E_r[:-1])
+W_f, W_r, E_f, E_r = pth.simulate_bidirectional(bridge, n_paths, store_energies=True)
 
 ## report estimated evidence and compare to exact value
 
@@ -37,6 +37,12 @@ module = Extension('paths._paths',
 
 #os.environ['CFLAGS'] = '-Wno-cpp'
 
+## parallelize checkerboard sweeps over lattice rows with OpenMP
+
+if os.environ.get('PATHS_OPENMP'):
+    module.extra_compile_args.append('-fopenmp')
+    module.extra_link_args.append('-fopenmp')
+
 setup(
     name=NAME,
     packages=find_packages(exclude=('tests',)),
@@ -19,6 +19,15 @@ with take_time('calculation of energy'):
 with take_time('sampling'):
     y = ising.sample(x, 1e6, beta)
 
+with take_time('checkerboard sampling'):
+    z = ising.sample(x, 1e6, beta, mode='checkerboard')
+
+with take_time('swendsen-wang sampling'):
+    z = ising.sample(x, 10, beta, mode='swendsen-wang')
+
+with take_time('wolff sampling'):
+    z = ising.sample(x, 100, beta, mode='wolff')
+
 print 'energy before: {0}, after: {1}'.format(ising.energy(x), ising.energy(y))
 
 titles = ('before', 'after')
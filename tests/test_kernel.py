@@ -2,6 +2,8 @@ import paths as pth
 import numpy as np
 import matplotlib.pylab as plt
 
+from paths.estimators import jarzynski
+
 def test_composition():
 
     T = pth.GaussianKernel(0.9, np.random.standard_normal() * 10, np.random.gamma(1))
@@ -42,7 +44,24 @@ def test_simulation(n=1e2, tau=0.995):
 
     fig.tight_layout()
 
+def test_work_statistics(n_paths=1e5):
+
+    start  = pth.GaussianKernel(0.9, 20., 10.)
+    end    = pth.GaussianKernel(0.995, 0., 1.)
+    bridge = pth.make_bridge(start, end, np.linspace(0., 1., 20), 5, pth.GeometricBridge)
+    stats  = pth.work_statistics(bridge)
+    W      = pth.simulate(bridge, n_paths)[0]
+
+    ## relative variance of the weights exp(-W), shifted for stability
+    w = np.exp(W.min() - W)
+
+    print 'exact: mean={0:.2f}, var={1:.2f}, log_Z={2:.3f}, rel. var={3:.3f}'.format(
+        stats['mean'], stats['var'], stats['log_Z'], stats['relative_variance'])
+    print 'simulated: mean={0:.2f}, var={1:.2f}, log_Z={2:.3f}, rel. var={3:.3f}'.format(
+        W.mean(), W.var(), -jarzynski(W), w.var() / w.mean()**2)
+
 test_composition()
+test_work_statistics()
 
 ## probabing different relaxation rates
 
@@ -0,0 +1,43 @@
+import numpy as np
+import paths as pth
+
+from paths import take_time
+from paths.estimators import jarzynski
+
+def random_covariance(d, scale=1.):
+
+    A = np.random.standard_normal((d,d))
+    return scale * (np.dot(A, A.T) / d + 0.5 * np.eye(d))
+
+def test_kl(d=5, n=1e5):
+    """
+    Compare exact relative entropy with Monte Carlo estimate
+    """
+    p = pth.MultivariateGaussian(np.random.standard_normal(d), random_covariance(d, 2.))
+    q = pth.MultivariateGaussian(np.random.standard_normal(d), random_covariance(d))
+    x = p.sample(n=n)
+
+    print 'KL exact={0:.3f}, sampled={1:.3f}'.format(
+        p.kl(q), np.mean(q.energy(x) - p.energy(x)) + q.log_Z - p.log_Z)
+
+def test_simulation(d=100, n_beta=50, n_paths=1000):
+    """
+    Compare exact log ratio of normalization constants with AIS estimate
+    """
+    start = pth.MultivariateGaussianKernel(0.9, np.random.standard_normal(d),
+                                           random_covariance(d, 2.))
+    end   = pth.MultivariateGaussianKernel(0.99, np.zeros(d), random_covariance(d))
+    log_Z = end.stationary.log_Z - start.stationary.log_Z
+
+    for constructor in (pth.MultivariateBridge, pth.MultivariateGeometricBridge):
+
+        with take_time('{0} with d={1}'.format(constructor.__name__, d)):
+            bridge = pth.make_bridge(start, end, np.linspace(0., 1., n_beta), 5, constructor)
+            W = pth.simulate(bridge, n_paths)[0]
+
+        print 'log(Z)={0:.2f}, AIS={1:.2f}'.format(log_Z, -jarzynski(W))
+
+if __name__ == '__main__':
+
+    test_kl()
+    test_simulation()
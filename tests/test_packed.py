@@ -0,0 +1,29 @@
+import numpy as np
+import paths as pth
+
+from paths import take_time
+
+L      = 2**7
+ising  = pth.IsingModel(L)
+packed = pth.PackedIsingModel(L)
+beta   = 0.5 * np.log(1 + 2**0.5)      ## critical inverse temperature
+x      = ising.sample(beta=0., size=100)
+p      = packed.pack(x)
+
+print 'packing is lossless:', np.all(packed.unpack(p) == x)
+print 'energies agree:', np.allclose(packed.energy(p), ising.energy(x))
+print 'memory: {0} vs {1} bytes'.format(x.nbytes, p.nbytes)
+
+with take_time('calculation of energy'):
+    ising.energy(x)
+
+with take_time('calculation of packed energy'):
+    packed.energy(p)
+
+with take_time('checkerboard sampling'):
+    y = ising.sample(x[0], 1e6, beta, mode='checkerboard')
+
+with take_time('multi-spin coded sampling'):
+    q = packed.sample(p[0], 1e6, beta)
+
+print 'energy after: {0}, packed: {1}'.format(ising.energy(y), packed.energy(q))
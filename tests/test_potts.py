@@ -23,6 +23,15 @@ with take_time('calculation of energy'):
 with take_time('sampling'):
     y = potts.sample(x, 1e7, beta)
 
+with take_time('checkerboard sampling'):
+    z = potts.sample(x, 1e7, beta, mode='checkerboard')
+
+with take_time('swendsen-wang sampling'):
+    z = potts.sample(x, 10, beta, mode='swendsen-wang')
+
+with take_time('wolff sampling'):
+    z = potts.sample(x, 100, beta, mode='wolff')
+
 print 'energy before: {0}, after: {1}'.format(potts.energy(x), potts.energy(y))
 
 titles = ('before', 'after')
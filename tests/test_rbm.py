@@ -2,6 +2,8 @@ import os
 import numpy as np
 import paths as pth
 
+from paths import take_time
+
 params = np.load('./data/mnistvh_CD25.npz')
                
 rbm = pth.RBM(params['a'], params['b'], params['W'])
@@ -9,3 +11,15 @@ rbm = pth.RBM(params['a'], params['b'], params['W'])
 x = rbm.sample(beta=0.)
 
 print rbm.energy(x), rbm.energy_py(x)
+
+X = rbm.sample(beta=0., size=100)
+
+with take_time('block Gibbs sampling of 100 chains'):
+    X = rbm.sample(X, 10)
+
+print rbm.energy(X)[:10]
+
+with take_time('free energy of 100 chains'):
+    F = rbm.free_energy(X)
+
+print F[:10]
@@ -2,6 +2,8 @@ import numpy as np
 import paths as pth
 import matplotlib.pylab as plt
 
+from paths import take_time
+
 start = pth.GaussianKernel(0.9, 20., 10.)
 end   = pth.GaussianKernel(0.995, 0., 1.)
 
@@ -13,6 +15,9 @@ schedule  = scheduler.find_schedule(10)
 scheduler = pth.Scheduler(start, end, pth.GeometricBridge)
 schedule2 = scheduler.find_schedule(10)
 
+with take_time('optimization of 200 stages'):
+    pth.Scheduler(start, end, pth.GeometricBridge, cache=None).find_schedule(200)
+
 bridge  = pth.make_bridge(start, end, schedule, constructor=pth.Bridge)
 bridge2 = pth.make_bridge(start, end, schedule2, constructor=pth.GeometricBridge)
 
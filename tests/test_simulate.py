@@ -0,0 +1,85 @@
+import os
+import tempfile
+import multiprocessing
+import numpy as np
+import paths as pth
+
+def gaussian_bridge(n_beta=20):
+
+    start = pth.GaussianKernel(0.9, 20., 10.)
+    end   = pth.GaussianKernel(0.995, 0., 1.)
+
+    return pth.make_bridge(start, end, np.linspace(0., 1., n_beta), 5)
+
+def ising_bridge(L=16, n_beta=10):
+
+    return [pth.IsingKernel(L, beta, L**2, 'checkerboard')
+            for beta in np.linspace(0., 1., n_beta)]
+
+def test_resume(n_paths=100, stage=7, seed=1):
+    """
+    A run that is interrupted after 'stage' and resumed from its
+    checkpoint should reproduce the uninterrupted run
+    """
+    filename = os.path.join(tempfile.mkdtemp(), 'checkpoint.npz')
+
+    for bridge in (gaussian_bridge(), ising_bridge()):
+
+        W, x = pth.simulate(bridge, n_paths, rng=seed)
+
+        ## interrupted run: the checkpoint holds the state after 'stage'
+        checkpoint = pth.Checkpoint(filename, every=3)
+        pth.simulate(bridge[:stage+1], n_paths, rng=seed, checkpoint=checkpoint)
+        W2, x2 = pth.resume(bridge, checkpoint)
+
+        print '{0}: resumed work agrees: {1}, states agree: {2}'.format(
+            bridge[0].__class__.__name__, np.allclose(W, W2), np.all(x == x2))
+
+    os.remove(filename)
+
+def test_sharding(n_paths=1000, n_shards=8, seed=1):
+    """
+    Sharded runs with the same seed and number of shards should not
+    depend on the number of worker processes
+    """
+    for bridge in (gaussian_bridge(), ising_bridge()):
+
+        results = []
+        for n_workers in (1, 2, 4):
+            pool = multiprocessing.Pool(n_workers)
+            results.append(pth.simulate(bridge, n_paths, rng=seed, pool=pool, n_shards=n_shards))
+            pool.close()
+            pool.join()
+
+        W, x = results[0]
+
+        print '{0}: sharded work agrees: {1}, states agree: {2}'.format(
+            bridge[0].__class__.__name__,
+            all(np.all(W == W2) for W2, _ in results[1:]),
+            all(np.all(x == x2) for _, x2 in results[1:]))
+
+def test_compiled(n_paths=1000, n_beta=20, seed=1):
+    """
+    Compiled bridges should give the same work and final states as
+    the corresponding lists of kernels
+    """
+    start = pth.GaussianKernel(0.9, 20., 10.)
+    end   = pth.GaussianKernel(0.995, 0., 1.)
+
+    for constructor in (pth.Bridge, pth.GeometricBridge):
+
+        schedule = np.linspace(0., 1., n_beta)
+        bridge   = pth.make_bridge(start, end, schedule, 5, constructor)
+        compiled = pth.make_bridge(start, end, schedule, 5, constructor, compiled=True)
+
+        W, x   = pth.simulate(bridge, n_paths, rng=seed)
+        W2, x2 = pth.simulate(compiled, n_paths, rng=seed)
+
+        print '{0}: compiled work agrees: {1}, states agree: {2}'.format(
+            constructor.__name__, np.allclose(W, W2), np.allclose(x, x2))
+
+if __name__ == '__main__':
+
+    test_resume()
+    test_sharding()
+    test_compiled()
@@ -0,0 +1,75 @@
+import numpy as np
+import paths as pth
+
+from paths import take_time
+from paths.estimators import jarzynski
+
+def test_resampling(n=1000, n_trials=1000):
+    """
+    Resampled copy numbers should match the weights on average
+    """
+    w = np.random.dirichlet(np.ones(n))
+
+    for resample in (pth.systematic_resampling, pth.residual_resampling):
+
+        counts = np.zeros(n)
+        for _ in xrange(n_trials):
+            counts += np.bincount(resample(w), minlength=n)
+
+        print resample.__name__, np.fabs(counts / n_trials / n - w).max()
+
+def test_smc(L=16, n_beta=15, n_paths=300, n_trials=10):
+    """
+    Compare SMC with annealed importance sampling on a short bridge
+    """
+    entropy = pth.IsingEntropy(L)
+    bridge  = [pth.IsingKernel(L, beta, 2*L**2, 'checkerboard')
+               for beta in np.linspace(0., 1., n_beta)]
+
+    with take_time('AIS'):
+        ais = [-jarzynski(pth.simulate(bridge, n_paths)[0]) for _ in xrange(n_trials)]
+
+    with take_time('SMC'):
+        smc = [pth.smc(bridge, n_paths)[0] for _ in xrange(n_trials)]
+
+    print 'log(Z)={0:.2f}, AIS={1:.2f}+/-{2:.2f}, SMC={3:.2f}+/-{4:.2f}'.format(
+        entropy.log_Z(1.), np.mean(ais), np.std(ais), np.mean(smc), np.std(smc))
+
+def test_adaptive(L=16, n_paths=300, target=0.9):
+    """
+    Compare a linear schedule with an adaptive schedule of the same length
+    """
+    entropy  = pth.IsingEntropy(L)
+    kernel   = lambda beta: pth.IsingKernel(L, beta, 2*L**2, 'checkerboard')
+
+    with take_time('pilot run'):
+        adaptive = pth.adaptive_schedule(kernel, target=target)
+
+    for beta in (np.linspace(0., 1., len(adaptive)), adaptive):
+        W = pth.simulate(map(kernel, beta), n_paths)[0]
+        print 'K={0}, log(Z)={1:.2f}, AIS={2:.2f}, var(W)={3:.2f}'.format(
+            len(beta), entropy.log_Z(1.), -jarzynski(W), np.var(W))
+
+def test_adaptive_bridge(L=16, target=0.9, seed=1):
+    """
+    An adaptive lattice bridge ending at beta_c should have the same
+    inverse temperatures as a pilot run in the inverse temperature
+    """
+    beta_c = 0.5 * np.log(1 + 2**0.5)
+    kernel = lambda beta: pth.IsingKernel(L, beta, 2*L**2, 'checkerboard')
+    start, end = kernel(0.), kernel(beta_c)
+
+    schedule = pth.adaptive_schedule(kernel, target=target, beta_max=beta_c, rng=seed)
+    bridge   = pth.make_bridge(start, end, 'adaptive', constructor=pth.lattice_bridge,
+                               pilot=dict(target=target, rng=seed))
+    beta     = np.array([T.beta for T in bridge])
+
+    print 'K={0} (bridge), K={1} (inverse temperature), max. deviation={2:.1e}'.format(
+        len(beta), len(schedule), np.fabs(beta - schedule).max() if len(beta) == len(schedule) else np.inf)
+
+if __name__ == '__main__':
+
+    test_resampling()
+    test_smc()
+    test_adaptive()
+    test_adaptive_bridge()
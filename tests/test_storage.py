@@ -0,0 +1,35 @@
+import os
+import tempfile
+import numpy as np
+import paths as pth
+
+def test_trajectory_store(n_paths=100, n_beta=20, seed=1):
+    """
+    Paths written to a trajectory file should match the paths kept in
+    memory, and stages and single paths should be views into the file
+    """
+    filename = os.path.join(tempfile.mkdtemp(), 'paths.dat')
+
+    start  = pth.GaussianKernel(0.9, 20., 10.)
+    end    = pth.GaussianKernel(0.995, 0., 1.)
+    beta   = np.linspace(0., 1., n_beta)
+    bridge = pth.make_bridge(start, end, beta)
+
+    W, X = pth.simulate(bridge, n_paths, store_paths=True, rng=seed)
+    pth.simulate(bridge, n_paths, store_paths=filename, rng=seed)
+
+    store = pth.TrajectoryStore(filename)
+
+    print 'shape agrees:', store.paths.shape == X.shape
+    print 'paths agree:', np.all(store.paths == X)
+    print 'inverse temperatures agree:', np.allclose(store.header['beta'], beta)
+    print 'stages agree:', all(np.all(store.stage(k) == X[k]) for k in range(len(store)))
+    print 'single paths agree:', all(np.all(store.path(i) == X[:,i]) for i in range(n_paths))
+    print 'views share memory:', np.may_share_memory(store.stage(1), store.paths) and \
+          np.may_share_memory(store.path(1), store.paths)
+
+    os.remove(filename)
+
+if __name__ == '__main__':
+
+    test_trajectory_store()